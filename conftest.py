@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache():
+    """Свой файл кэша на запуск pytest, как у manage.py test."""
+    from yatube.testing import isolated_cache
+
+    with isolated_cache():
+        yield
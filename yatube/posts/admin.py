@@ -1,9 +1,23 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск по индексу FTS5 вместо LIKE '%слово%' по search_fields.
+
+    search_fields всё равно нужны: без них админка не покажет строку
+    поиска.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
@@ -16,7 +30,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author',)
     search_fields = ('text',)
     list_filter = ('created',)
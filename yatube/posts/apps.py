@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from PIL import Image
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import search, signals
+        from yatube import sqlite
+        post_migrate.connect(signals.migrated, sender=self)
+        connection_created.connect(sqlite.configure)
+        connection_created.connect(search.connect)
+        # Pillow сам откажется открывать картинку вдвое больше лимита
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
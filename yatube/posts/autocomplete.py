@@ -0,0 +1,267 @@
+"""Подсказки авторов и групп по первым буквам.
+
+Индекс живёт в памяти процесса: отсортированный список ключей и
+параллельный список ссылок на объекты; поиск — один bisect и проход по
+не больше чем limit записям, так что время ответа почти не зависит от
+числа пользователей. Ключи — имя пользователя, slug группы, её название
+целиком и каждое слово названия, в casefold и с «ё» как «е».
+
+Изменения этого процесса (регистрация, новая или переименованная
+группа) вносятся в индекс сразу после фиксации транзакции и пишутся в
+журнал в общем кэше под номерами по порядку. Остальные процессы не
+чаще раза в AUTOCOMPLETE_CHECK_INTERVAL секунд дочитывают журнал и
+применяют те же изменения к своему индексу. Целиком из базы индекс
+перестраивается только при старте и если журнал потерян (вытеснен,
+истёк или начат заново), и строится он в стороне: поиск тем временем
+отвечает по старому индексу.
+"""
+import threading
+import time
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import Group
+
+User = get_user_model()
+
+USER = 'user'
+GROUP = 'group'
+# текущая эпоха журнала; новая эпоха — знак перестроить индекс
+LOG = 'autocomplete:log'
+# столько записей журнала читается одним запросом к кэшу
+LOG_BATCH = 100
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def user_keys(username):
+    return {normalize(username)}
+
+
+def group_keys(title, slug):
+    title = normalize(title)
+    return {title, normalize(slug), *title.split()}
+
+
+def entry_key(epoch, number):
+    return f'autocomplete:{epoch}:{number}'
+
+
+def last_key(epoch):
+    # номер последней записи; подсказка, с какого номера писать дальше
+    return f'autocomplete:{epoch}:last'
+
+
+def new_epoch():
+    epoch = uuid4().hex
+    cache.set(last_key(epoch), 0, None)
+    cache.set(LOG, epoch, None)
+    return epoch
+
+
+def log_epoch():
+    return cache.get(LOG) or new_epoch()
+
+
+def publish(change):
+    """Записать изменение в журнал под следующим свободным номером."""
+    epoch = log_epoch()
+    last = cache.get(last_key(epoch))
+    if last is None:
+        # подсказку вытеснили: номера уже не восстановить
+        epoch, last = new_epoch(), 0
+    number = last + 1
+    while not cache.add(
+        entry_key(epoch, number), change, settings.AUTOCOMPLETE_LOG_TIMEOUT
+    ):
+        number += 1
+    cache.set(last_key(epoch), number, None)
+
+
+def apply(index, change):
+    kind, pk, keys, value = change
+    if keys is None:
+        index.remove(kind, pk)
+    else:
+        index.add(kind, pk, keys, value)
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []
+        self.refs = []
+        # (вид, pk) -> (ключи, данные для ответа)
+        self.objects = {}
+
+    def add(self, kind, pk, keys, value):
+        self.remove(kind, pk)
+        for key in keys:
+            position = bisect_left(self.keys, key)
+            # среди одинаковых ключей порядок по (вид, pk)
+            while (position < len(self.keys) and self.keys[position] == key
+                   and self.refs[position] < (kind, pk)):
+                position += 1
+            self.keys.insert(position, key)
+            self.refs.insert(position, (kind, pk))
+        self.objects[kind, pk] = (keys, value)
+
+    def remove(self, kind, pk):
+        keys, _ = self.objects.pop((kind, pk), ((), None))
+        for key in keys:
+            position = bisect_left(self.keys, key)
+            while self.refs[position] != (kind, pk):
+                position += 1
+            del self.keys[position]
+            del self.refs[position]
+
+    def load(self, rows):
+        """Заполнить пустой индекс сразу: одна сортировка вместо вставок."""
+        pairs = []
+        for kind, pk, keys, value in rows:
+            self.objects[kind, pk] = (keys, value)
+            pairs.extend((key, (kind, pk)) for key in keys)
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.refs = [ref for _, ref in pairs]
+
+    def lookup(self, prefix, limit):
+        """До limit объектов с ключом на prefix, по алфавиту ключей."""
+        prefix = normalize(prefix.strip())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(results) < limit:
+            if not self.keys[position].startswith(prefix):
+                break
+            ref = self.refs[position]
+            if ref not in seen:
+                seen.add(ref)
+                results.append((ref[0], self.objects[ref][1]))
+            position += 1
+        return results
+
+
+class Autocomplete:
+    def __init__(self):
+        # lock защищает индекс, updating — дочитывание журнала и перестройку
+        self.lock = threading.Lock()
+        self.updating = threading.Lock()
+        self.index = None
+        self.epoch = None
+        self.position = 0
+        self.checked = 0
+
+    def rows(self):
+        users = User.objects.filter(is_active=True).values_list(
+            'pk', 'username'
+        )
+        for pk, username in users.iterator():
+            yield USER, pk, user_keys(username), username
+        for pk, title, slug in Group.objects.values_list(
+            'pk', 'title', 'slug'
+        ).iterator():
+            yield GROUP, pk, group_keys(title, slug), (title, slug)
+
+    def rebuild(self):
+        # номер читается до базы: записи после него применятся повторно,
+        # а add и remove от повтора не меняют индекс
+        epoch = log_epoch()
+        position = cache.get(last_key(epoch)) or 0
+        index = PrefixIndex()
+        index.load(self.rows())
+        with self.lock:
+            self.index = index
+        self.epoch = epoch
+        self.position = position
+
+    def catch_up(self):
+        """Применить новые записи журнала; False, если журнал потерян."""
+        if cache.get(LOG) != self.epoch:
+            return False
+        last = cache.get(last_key(self.epoch)) or 0
+        while True:
+            numbers = range(self.position + 1, self.position + LOG_BATCH + 1)
+            entries = cache.get_many(
+                [entry_key(self.epoch, number) for number in numbers]
+            )
+            changes = []
+            for number in numbers:
+                change = entries.get(entry_key(self.epoch, number))
+                if change is None:
+                    break
+                changes.append(change)
+            with self.lock:
+                for change in changes:
+                    apply(self.index, change)
+            self.position += len(changes)
+            if len(changes) < LOG_BATCH:
+                # дыра перед уже записанным номером: запись истекла
+                return self.position >= last
+
+    def current(self):
+        if (self.index is not None and time.monotonic() - self.checked
+                < settings.AUTOCOMPLETE_CHECK_INTERVAL):
+            return self.index
+        # пока другой поток обновляет индекс, отвечаем по текущему
+        if not self.updating.acquire(blocking=self.index is None):
+            return self.index
+        try:
+            if self.index is None or not self.catch_up():
+                self.rebuild()
+                self.catch_up()
+            self.checked = time.monotonic()
+            return self.index
+        finally:
+            self.updating.release()
+
+    def lookup(self, prefix, limit):
+        index = self.current()
+        with self.lock:
+            return index.lookup(prefix, limit)
+
+    def changed(self, kind, pk, keys=None, value=None):
+        """Внести изменение в индекс этого процесса и сообщить остальным."""
+        change = (kind, pk, keys, value)
+        with self.lock:
+            if self.index is not None:
+                apply(self.index, change)
+        publish(change)
+
+
+autocomplete = Autocomplete()
+
+
+def lookup(prefix, limit):
+    return autocomplete.lookup(prefix, limit)
+
+
+def user_changed(user):
+    if user.is_active:
+        autocomplete.changed(
+            USER, user.pk, user_keys(user.username), user.username
+        )
+    else:
+        autocomplete.changed(USER, user.pk)
+
+
+def user_deleted(pk):
+    autocomplete.changed(USER, pk)
+
+
+def group_changed(group):
+    autocomplete.changed(
+        GROUP, group.pk, group_keys(group.title, group.slug),
+        (group.title, group.slug),
+    )
+
+
+def group_deleted(pk):
+    autocomplete.changed(GROUP, pk)
@@ -0,0 +1,146 @@
+"""Поколения для ключей кэша лент.
+
+Каждая лента (index, группа, автор, лента подписок пользователя) имеет
+своё поколение. Оно входит в ключ фрагмента, поэтому после записи
+достаточно сменить поколение, и старые фрагменты просто перестают
+читаться. Поколение хранится как случайный токен, а не как счётчик:
+если ключ вытеснят из кэша, новое значение не совпадёт со старым, и
+устаревший фрагмент не воскреснет.
+
+Поколение ленты подписок follow:<id> меняется при записи только у
+подписчиков в режиме раскладки, а их у автора не больше
+FEED_FANOUT_LIMIT. Для авторов без раскладки есть одно общее поколение
+follow:pull, и его читают только подписчики таких авторов. Так и запись,
+и чтение ленты трогают ограниченное число ключей.
+
+В начале токена записано время смены поколения, из него же считаются
+Last-Modified и ETag для условных GET-запросов.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from .models import Follow
+
+PULL_FOLLOWERS = 'follow:pull'
+
+
+def _key(scope):
+    return f'generation:{scope}'
+
+
+def _token():
+    return f'{time.time_ns() // 1000:x}-{uuid4().hex[:12]}'
+
+
+def generation(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    tokens = cache.get_many(keys)
+    missing = {key: _token() for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return '.'.join(tokens[key] for key in keys)
+
+
+def modified_at(generation_value):
+    micros = max(
+        int(token.split('-')[0], 16)
+        for token in generation_value.split('.')
+    )
+    return datetime.fromtimestamp(micros / 10 ** 6, tz=timezone.utc)
+
+
+def bump(*scopes):
+    cache.set_many({_key(scope): _token() for scope in scopes}, None)
+
+
+def follow_scopes(user_id):
+    """Поколения ленты подписок; их число не зависит от числа подписок."""
+    scopes = [f'follow:{user_id}']
+    if Follow.objects.filter(user_id=user_id, fanout=False).exists():
+        scopes.append(PULL_FOLLOWERS)
+    return scopes
+
+
+def post_scopes(*posts, group_ids=()):
+    """Поколения всех лент, в которых видны посты."""
+    scopes = {'index'}
+    author_ids = set()
+    for post in posts:
+        author_ids.add(post.author_id)
+        scopes.update((f'author:{post.author_id}', f'post:{post.pk}'))
+        if post.group_id:
+            scopes.add(f'group:{post.group_id}')
+    scopes.update(f'group:{group_id}' for group_id in group_ids if group_id)
+    followers = Follow.objects.filter(author_id__in=author_ids)
+    scopes.update(
+        f'follow:{user_id}'
+        for user_id in followers.filter(fanout=True).values_list(
+            'user_id', flat=True
+        )
+    )
+    if followers.filter(fanout=False).exists():
+        scopes.add(PULL_FOLLOWERS)
+    return scopes
+
+
+def bump_post(post, group_ids=()):
+    bump(*post_scopes(post, group_ids=group_ids))
+
+
+def changed_at(get_scopes):
+    """get_changed_at для replicas.read_replica: время смены поколения."""
+    def get_changed_at(request, *args, **kwargs):
+        value = page_generation(get_scopes, request, *args, **kwargs)
+        return value and modified_at(value).timestamp()
+    return get_changed_at
+
+
+def page_generation(get_scopes, request, *args, **kwargs):
+    """Поколение страницы; считается один раз на запрос."""
+    if not hasattr(request, '_page_generation'):
+        scopes = get_scopes(request, *args, **kwargs)
+        request._page_generation = scopes and generation(*scopes)
+    return request._page_generation
+
+
+def conditional(get_scopes):
+    """condition() с валидаторами из поколений лент.
+
+    get_scopes(request, *args, **kwargs) возвращает поколения страницы
+    или None, если страницы нет. ETag учитывает пользователя и его
+    CSRF-cookie, Last-Modified отдаётся только анонимам: у вошедших
+    страницы персональные, и одной даты для них недостаточно.
+    Функция сохраняется в view.page_scopes для кэша страниц.
+    """
+    def etag(request, *args, **kwargs):
+        value = page_generation(get_scopes, request, *args, **kwargs)
+        if not value:
+            return None
+        parts = [value, request.get_full_path()]
+        if request.user.is_authenticated:
+            parts += [
+                str(request.user.pk),
+                request.META.get('CSRF_COOKIE', ''),
+            ]
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        value = page_generation(get_scopes, request, *args, **kwargs)
+        if not value or request.user.is_authenticated:
+            return None
+        return modified_at(value)
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view
+        )
+        view.page_scopes = get_scopes
+        return view
+
+    return decorator
@@ -0,0 +1,116 @@
+"""Докачиваемые загрузки картинок.
+
+Клиент открывает сессию (posts.views.upload_start), шлёт части
+короткими PUT и в конце отправляет обычную форму поста с upload_id
+вместо файла. Части пишутся прямо на свои места в один файл, так что
+собирать их не нужно, а повтор той же части просто перезаписывает те
+же байты. Собранный файл проходит через PostForm как обычная загрузка,
+с теми же проверками и очисткой метаданных.
+"""
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+
+from .models import ChunkedUpload, ChunkedUploadPart
+
+COPY_BUFFER = 64 * 1024
+
+
+class InvalidChunk(Exception):
+    pass
+
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_ROOT, f'{upload.pk}.part')
+
+
+def start(user, filename, size):
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise InvalidChunk(
+            f'Размер файла должен быть от 1 байта до '
+            f'{settings.CHUNKED_UPLOAD_MAX_SIZE} байт'
+        )
+    return ChunkedUpload.objects.create(
+        user=user,
+        filename=os.path.basename(filename)[:255] or 'upload',
+        size=size,
+        chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    )
+
+
+def write_chunk(upload, index, stream, length):
+    """Записать часть index из stream на её место в файле.
+
+    Тело запроса читается кусками, поэтому память не зависит от
+    размера части.
+    """
+    if not 0 <= index < upload.chunks:
+        raise InvalidChunk('Нет такой части')
+    if length != upload.chunk_length(index):
+        raise InvalidChunk(
+            f'Часть {index} должна быть длиной '
+            f'{upload.chunk_length(index)} байт'
+        )
+    os.makedirs(settings.CHUNKED_UPLOAD_ROOT, exist_ok=True)
+    descriptor = os.open(part_path(upload), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        offset = index * upload.chunk_size
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER, remaining))
+            if not data:
+                raise InvalidChunk('Часть пришла не целиком')
+            os.pwrite(descriptor, data, offset)
+            offset += len(data)
+            remaining -= len(data)
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+    ChunkedUploadPart.objects.bulk_create(
+        [ChunkedUploadPart(upload=upload, index=index)],
+        ignore_conflicts=True,
+    )
+
+
+class AssembledUpload(UploadedFile):
+    """Собранный файл в виде обычной загрузки для PostForm."""
+
+    def __init__(self, upload):
+        self.path = part_path(upload)
+        super().__init__(
+            open(self.path, 'rb'), upload.filename, None, upload.size
+        )
+
+    def temporary_file_path(self):
+        return self.path
+
+
+@contextmanager
+def assembled(upload):
+    """Файл загрузки на время блока или None, если частей не хватает.
+
+    Файл нужен открытым до сохранения поста: очищенную картинку
+    CleanedUpload дочитывает из него при записи.
+    """
+    if upload.missing():
+        yield None
+        return
+    file = AssembledUpload(upload)
+    try:
+        yield file
+    finally:
+        file.close()
+
+
+def finish(upload):
+    """Удалить сессию и её файл, когда пост сохранён."""
+    path = part_path(upload)
+    upload.delete()
+
+    def remove():
+        if os.path.exists(path):
+            os.remove(path)
+    transaction.on_commit(remove)
@@ -0,0 +1,117 @@
+"""Хэштеги и упоминания в тексте постов.
+
+При создании и правке поста из текста выбираются #теги и @имена, и
+они раскладываются в PostTag и PostMention. Лента тега читается одним
+диапазоном по индексу (tag, pub_date) вместо поиска по тексту.
+Теги хранятся в casefold и с «ё» как «е», так что #Котики и #котики —
+один тег. Упоминания записываются только для существующих
+пользователей.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+
+from .models import Post, PostMention, PostTag
+from .paginator import CursorPaginator, keyset_slice
+
+User = get_user_model()
+
+# столько тегов и упоминаний одного поста попадает в индекс
+MAX_TAGS = 30
+MAX_MENTIONS = 30
+TAG_LENGTH = PostTag._meta.get_field('tag').max_length
+
+# тег — слово хотя бы с одной буквой, чтобы #1 в тексте не был тегом
+TAG = re.compile(r'(?<![\w#])#(\w*[^\W\d_]\w*)')
+MENTION = re.compile(r'(?<![\w@])@([\w.+-]+)')
+
+
+def normalize(tag):
+    return tag.casefold().replace('ё', 'е')
+
+
+def tag_matches(text):
+    """Вхождения тегов, которые попадают в индекс, и сами теги.
+
+    Слишком длинные теги и всё сверх первых MAX_TAGS разных тегов
+    пропускаются: по ним лента тега ничего не найдёт.
+    """
+    tags = set()
+    for match in TAG.finditer(text):
+        tag = normalize(match.group(1))
+        if len(tag) > TAG_LENGTH:
+            continue
+        if tag not in tags:
+            if len(tags) == MAX_TAGS:
+                continue
+            tags.add(tag)
+        yield match, tag
+
+
+def parse_tags(text):
+    """Теги текста без повторов, в порядке появления."""
+    return list(dict.fromkeys(tag for _, tag in tag_matches(text)))
+
+
+def parse_mentions(text):
+    """Имена после @ без повторов; точка в конце — знак препинания."""
+    names = {}
+    for match in MENTION.finditer(text):
+        names.setdefault(match.group(1).rstrip('.'))
+        if len(names) == MAX_MENTIONS:
+            break
+    return [name for name in names if name]
+
+
+def _sync(manager, post, field, values, make):
+    current = set(manager.filter(post=post).values_list(field, flat=True))
+    removed = current - values
+    if removed:
+        manager.filter(post=post, **{f'{field}__in': removed}).delete()
+    added = values - current
+    if added:
+        manager.bulk_create(
+            (make(value) for value in added), ignore_conflicts=True
+        )
+
+
+def index_post(post):
+    """Привести теги и упоминания поста в соответствие с его текстом."""
+    _sync(
+        PostTag.objects, post, 'tag', set(parse_tags(post.text)),
+        lambda tag: PostTag(tag=tag, post=post, pub_date=post.pub_date),
+    )
+    names = parse_mentions(post.text)
+    users = set(
+        User.objects.filter(username__in=names).values_list('pk', flat=True)
+    ) if names else set()
+    _sync(
+        PostMention.objects, post, 'user_id', users,
+        lambda pk: PostMention(user_id=pk, post=post, pub_date=post.pub_date),
+    )
+
+
+class TagPaginator(CursorPaginator):
+    """Лента тега: диапазон PostTag по (tag, pub_date).
+
+    Курсор тот же, что у остальных лент, поэтому ссылки и ?page=N
+    работают как у group_posts; номера страниц считаются по соединению
+    PostTag и Post.
+    """
+
+    def __init__(self, tag, per_page, **kwargs):
+        self.tag = tag
+        super().__init__(
+            Post.objects.for_feed().filter(tags__tag=tag), per_page, **kwargs
+        )
+
+    def fetch(self, values, reverse, limit):
+        entries = PostTag.objects.filter(tag=self.tag).select_related(
+            'post', 'post__author', 'post__group'
+        )
+        return [
+            entry.post
+            for entry in keyset_slice(
+                entries, ('-pub_date', '-post_id'), values, reverse, limit
+            )
+        ]
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import caching
+from posts.hashtags import parse_mentions, parse_tags
+from posts.models import Post, PostMention, PostTag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Заполняет хэштеги и упоминания у старых постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tagged = mentioned = processed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'pub_date', 'text')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            tags = []
+            mentions = {}
+            for pk, pub_date, text in batch:
+                tags += [
+                    PostTag(tag=tag, post_id=pk, pub_date=pub_date)
+                    for tag in parse_tags(text)
+                ]
+                for name in parse_mentions(text):
+                    mentions.setdefault(name, []).append((pk, pub_date))
+            # имена всей пачки проверяются одним запросом
+            users = User.objects.filter(
+                username__in=list(mentions)
+            ).values_list('username', 'pk') if mentions else []
+            mention_rows = [
+                PostMention(user_id=user_pk, post_id=pk, pub_date=pub_date)
+                for username, user_pk in users
+                for pk, pub_date in mentions[username]
+            ]
+            pks = [pk for pk, _, _ in batch]
+            # пачка переписывается целиком: так повторный запуск
+            # убирает и теги, исчезнувшие из текста
+            with transaction.atomic():
+                PostTag.objects.filter(post_id__in=pks).delete()
+                PostMention.objects.filter(post_id__in=pks).delete()
+                PostTag.objects.bulk_create(tags, ignore_conflicts=True)
+                PostMention.objects.bulk_create(
+                    mention_rows, ignore_conflicts=True
+                )
+            processed += len(batch)
+            tagged += len(tags)
+            mentioned += len(mention_rows)
+        caching.bump('index')
+        self.stdout.write(
+            f'Постов: {processed}, тегов: {tagged}, упоминаний: {mentioned}'
+        )
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'filebased': (
+        'django.core.cache.backends.filebased.FileBasedCache', 'files'
+    ),
+    'sqlite': ('yatube.sqlite_cache.SQLiteCache', 'cache.sqlite3'),
+}
+
+
+def worker(backend, location, keys, operations, seed, results):
+    """Смесь чтений, записей и incr, как у ленты под нагрузкой.
+
+    Ключи общие для всех процессов: попадание в кэш, записанный другим
+    процессом, и есть то, ради чего нужен общий бэкенд.
+    """
+    from django.utils.module_loading import import_string
+
+    cache = import_string(backend)(location, {'TIMEOUT': None})
+    pid = os.getpid()
+    generator = random.Random(seed)
+    hits = foreign_hits = reads = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f'key:{generator.randrange(keys)}'
+        choice = generator.random()
+        if choice < 0.8:
+            reads += 1
+            value = cache.get(key)
+            if value is not None:
+                hits += 1
+                foreign_hits += value != pid
+        elif choice < 0.95:
+            cache.set(key, pid)
+        else:
+            cache.add('counter', 0)
+            cache.incr('counter')
+    results.put((time.perf_counter() - started, reads, hits, foreign_hits))
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает бэкенды кэша под нагрузкой из нескольких процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=sorted(BACKENDS),
+            help='По умолчанию сравниваются все',
+        )
+
+    def handle(self, *args, **options):
+        for name in options['backend'] or BACKENDS:
+            directory = tempfile.mkdtemp()
+            try:
+                self.run(name, directory, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, name, directory, options):
+        backend, location = BACKENDS[name]
+        if location:
+            location = os.path.join(directory, location)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(
+                backend,
+                location,
+                options['keys'],
+                options['operations'],
+                seed,
+                results,
+            ))
+            for seed in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        rows = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        # запуск интерпретаторов в замер не входит
+        elapsed = max(row[0] for row in rows)
+        total = options['operations'] * len(processes)
+        reads = sum(row[1] for row in rows) or 1
+        hits = sum(row[2] for row in rows)
+        foreign = sum(row[3] for row in rows)
+        self.stdout.write(
+            f'{name}: {total / elapsed:,.0f} оп/с, '
+            f'попаданий {hits / reads:.0%}, '
+            f'из них записанных другим процессом {foreign / reads:.0%}'
+        )
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+ALIAS = 'bench'
+SEED_POSTS = 100
+
+# «как было»: журнал отката, без настройки соединений и с новым
+# соединением на каждую операцию, как при CONN_MAX_AGE = 0
+MODES = {
+    'default': {'journal_mode': 'DELETE', 'tuned': False},
+    'tuned': {'journal_mode': 'WAL', 'tuned': True},
+}
+
+
+def register(path):
+    connections.databases[ALIAS] = dict(
+        connections.databases[DEFAULT_DB_ALIAS], NAME=path
+    )
+
+
+def unregister():
+    if hasattr(connections._connections, ALIAS):
+        connections[ALIAS].close()
+        delattr(connections._connections, ALIAS)
+    connections.databases.pop(ALIAS, None)
+
+
+def worker(path, tuned, operations, writes, author_id, post_ids, seed,
+           barrier, results):
+    """Чтения ленты вперемешку с постами и комментариями.
+
+    Записи идут через bulk_create, чтобы сигналы не трогали основную
+    базу и кэш.
+    """
+    import django
+    django.setup()
+    from django.db import transaction
+    from django.db.backends.signals import connection_created
+    from posts import search
+    from posts.models import Comment, Post
+    from yatube import sqlite
+
+    if not tuned:
+        connection_created.disconnect(sqlite.configure)
+        connection_created.disconnect(search.connect)
+    register(path)
+    generator = random.Random(seed)
+    errors = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for number in range(operations):
+        try:
+            if generator.random() < writes:
+                with transaction.atomic(using=ALIAS):
+                    Post.objects.using(ALIAS).bulk_create([
+                        Post(text=f'Пост {seed}-{number}', author_id=author_id)
+                    ])
+                    Comment.objects.using(ALIAS).bulk_create([
+                        Comment(
+                            post_id=generator.choice(post_ids),
+                            author_id=author_id,
+                            text=f'Комментарий {seed}-{number}',
+                        )
+                    ])
+            else:
+                list(Post.objects.using(ALIAS).for_feed()[:10])
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            errors += 1
+        if not tuned:
+            connections[ALIAS].close()
+    results.put((time.perf_counter() - started, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite с настройками по умолчанию и с WAL и '
+        'постоянными соединениями под параллельными чтениями и записями. '
+        'Нагрузка идёт на временную копию базы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=500)
+        parser.add_argument(
+            '--writes',
+            type=float,
+            default=0.2,
+            help='Доля операций записи',
+        )
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=sorted(MODES),
+            help='По умолчанию сравниваются все',
+        )
+
+    def handle(self, *args, **options):
+        for name in options['mode'] or MODES:
+            directory = tempfile.mkdtemp()
+            try:
+                self.run(name, os.path.join(directory, 'db.sqlite3'), options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def prepare(self, path, journal_mode):
+        """Скопировать основную базу, добавить автора и посты."""
+        from posts.models import Post, User
+
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        source.connection.backup(target)
+        target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        target.close()
+        register(path)
+        try:
+            User.objects.using(ALIAS).bulk_create(
+                [User(username='bench-db')], ignore_conflicts=True
+            )
+            author = User.objects.using(ALIAS).get(username='bench-db')
+            missing = SEED_POSTS - Post.objects.using(ALIAS).count()
+            Post.objects.using(ALIAS).bulk_create(
+                Post(text='Пост для комментариев', author=author)
+                for _ in range(max(missing, 0))
+            )
+            post_ids = list(
+                Post.objects.using(ALIAS).values_list('pk', flat=True)
+                [:SEED_POSTS]
+            )
+        finally:
+            unregister()
+        return author.pk, post_ids
+
+    def run(self, name, path, options):
+        mode = MODES[name]
+        author_id, post_ids = self.prepare(path, mode['journal_mode'])
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        barrier = context.Barrier(options['processes'])
+        processes = [
+            context.Process(target=worker, args=(
+                path,
+                mode['tuned'],
+                options['operations'],
+                options['writes'],
+                author_id,
+                post_ids,
+                seed,
+                barrier,
+                results,
+            ))
+            for seed in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        rows = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        # запуск интерпретаторов в замер не входит
+        elapsed = max(row[0] for row in rows)
+        total = options['operations'] * len(processes)
+        errors = sum(row[1] for row in rows)
+        self.stdout.write(
+            f'{name}: {total / elapsed:,.0f} оп/с, '
+            f'ошибок «database is locked»: {errors}'
+        )
@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+SYLLABLES = (
+    'ка', 'ро', 'ми', 'ле', 'ту', 'на', 'зо', 'вы', 'ше', 'пу', 'да', 'ги',
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def make_word(generator):
+    return ''.join(
+        generator.choice(SYLLABLES) for _ in range(generator.randint(2, 4))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу FTS5 с LIKE по тексту постов. '
+        'Посты создаются во временной транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--words', type=int, default=5000)
+        parser.add_argument('--queries', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        generator = random.Random(0)
+        vocabulary = [make_word(generator) for _ in range(options['words'])]
+        author = User.objects.create(username='bench-search')
+        started = time.perf_counter()
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author=author,
+                    text=' '.join(generator.choices(vocabulary, k=40)),
+                )
+                for _ in range(options['posts'])
+            ),
+            batch_size=500,
+        )
+        self.stdout.write(
+            f'{options["posts"]} постов с индексом за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        # LIKE останавливается на десятой находке, а слова без находок
+        # заставляют его пройти всю таблицу
+        workloads = {
+            'есть в постах': generator.choices(
+                vocabulary, k=options['queries']
+            ),
+            'нет в постах': [
+                'щ' + make_word(generator) for _ in range(options['queries'])
+            ],
+        }
+        posts = Post.objects.for_feed()
+        cases = {
+            'LIKE, страница': lambda term: list(
+                posts.filter(text__icontains=term)[:10]
+            ),
+            'FTS5, страница': lambda term: search.SearchPaginator(
+                posts, 10, term
+            ).get_page().object_list,
+            'LIKE, админка (count)': lambda term: posts.filter(
+                text__icontains=term
+            ).count(),
+            'FTS5, админка (count)': lambda term: search.matching(
+                posts, term
+            ).count(),
+        }
+        for workload, terms in workloads.items():
+            for title, case in cases.items():
+                started = time.perf_counter()
+                for term in terms:
+                    case(term)
+                elapsed = (time.perf_counter() - started) / len(terms)
+                self.stdout.write(
+                    f'{title}, слова {workload}: '
+                    f'{elapsed * 1000:.2f} мс на запрос'
+                )
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import chunked, thumbnails
+from posts.models import ChunkedUpload, Post, StoredFile
+from posts.storage import is_content_name, post_images
+
+HOUR = 60 * 60
+
+
+def scan(path, recursive=True):
+    """Все файлы под path как os.DirEntry, без списка в памяти."""
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    yield from scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def upload_id(filename):
+    try:
+        return uuid.UUID(os.path.splitext(filename)[0])
+    except ValueError:
+        return None
+
+
+class BloomFilter:
+    """Множество строк в памяти фиксированного размера.
+
+    Бывает, что фильтр говорит «есть» про строку, которой не добавляли
+    (с вероятностью error_rate), но «нет» про добавленную — никогда.
+    Сборщику мусора это подходит: ошибка оставит лишний файл, а не
+    удалит нужный.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(
+            64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        step = int.from_bytes(digest[8:], 'big') | 1
+        for number in range(self.hashes):
+            yield (first + number * step) % self.size
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(value)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, на которые не ссылается ни один пост, '
+        'миниатюры, которых нет в манифестах, и брошенные загрузки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Не трогать картинки, изменённые за последние N часов',
+        )
+        parser.add_argument(
+            '--thumbnail-min-age',
+            type=float,
+            default=7 * 24,
+            help='Не трогать миниатюры, изменённые за последние N часов',
+        )
+        parser.add_argument(
+            '--upload-max-age',
+            type=float,
+            default=48,
+            help='Через сколько часов без новых частей загрузка брошена',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=200,
+            help='Не больше N удалений в секунду; 0 — без ограничения',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.rate = options['rate']
+        self.verbosity = options['verbosity']
+        self.next_delete = time.monotonic()
+        now = time.time()
+        results = [
+            ('Картинок', self.collect_images(now - options['min_age'] * HOUR)),
+            ('миниатюр', self.collect_thumbnails(
+                now - options['thumbnail_min_age'] * HOUR
+            )),
+            ('загрузок', self.collect_uploads(
+                now - options['upload_max_age'] * HOUR
+            )),
+        ]
+        verb = 'будет удалено' if self.dry_run else 'удалено'
+        self.stdout.write('; '.join(
+            f'{title} {verb}: {count} ({size / 2 ** 20:.1f} МБ)'
+            for title, (count, size) in results
+        ))
+
+    def relative(self, path, root):
+        return os.path.relpath(path, root).replace(os.sep, '/')
+
+    def delete(self, path, cutoff):
+        """Удалить файл, если он всё ещё старше cutoff; вернуть его размер.
+
+        Время перепроверяется прямо перед удалением: пока шёл обход,
+        файл могли загрузить заново (см. posts.storage.touch).
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat.st_mtime >= cutoff:
+            return None
+        if self.verbosity > 1:
+            self.stdout.write(path)
+        if self.dry_run:
+            return stat.st_size
+        if self.rate:
+            # удаления равномерно растянуты, чтобы не забивать диск
+            delay = self.next_delete - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_delete = max(
+                self.next_delete, time.monotonic()
+            ) + 1 / self.rate
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size
+
+    def old_files(self, root, cutoff, recursive=True):
+        for entry in scan(root, recursive):
+            if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                yield entry
+
+    def collect_images(self, cutoff):
+        """Картинки постов, которых нет ни в Post.image, ни в StoredFile.
+
+        Файлы и база сверяются пачками по batch_size имён.
+        """
+        root = post_images.location
+        count = size = 0
+        files = self.old_files(os.path.join(root, 'posts'), cutoff)
+        for batch in batched(files, self.batch_size):
+            names = {self.relative(entry.path, root): entry for entry in batch}
+            referenced = set(
+                Post.objects.filter(image__in=names)
+                .values_list('image', flat=True)
+            )
+            referenced.update(
+                StoredFile.objects.filter(name__in=names, references__gt=0)
+                .values_list('name', flat=True)
+            )
+            deleted = []
+            for name, entry in names.items():
+                if name in referenced:
+                    continue
+                freed = self.delete(entry.path, cutoff)
+                if freed is not None:
+                    count += 1
+                    size += freed
+                    deleted.append(name)
+            if deleted and not self.dry_run:
+                StoredFile.objects.filter(
+                    name__in=[name for name in deleted
+                              if is_content_name(name)],
+                    references=0,
+                ).delete()
+        # временные файлы загрузок, прерванных падением процесса
+        temporary = (
+            entry for entry in self.old_files(root, cutoff, recursive=False)
+            if entry.name.startswith('.upload-')
+        )
+        for entry in temporary:
+            freed = self.delete(entry.path, cutoff)
+            if freed is not None:
+                count += 1
+                size += freed
+        return count, size
+
+    def live_thumbnails(self):
+        """Миниатюры из манифестов текущих картинок постов."""
+        manifests = (
+            Post.objects.filter(image__gt='')
+            .exclude(image_manifest='')
+            .values_list('image', 'image_manifest')
+        )
+        per_manifest = len(thumbnails.FORMATS) * sum(
+            len(list(thumbnails.variant_geometries(geometry)))
+            for geometry, _ in thumbnails.GEOMETRIES
+        )
+        live = BloomFilter(manifests.count() * per_manifest)
+        for name, manifest in manifests.iterator(chunk_size=self.batch_size):
+            if json.loads(manifest).get('source') != name:
+                continue
+            for thumbnail in thumbnails.manifest_files(manifest):
+                live.add(thumbnail)
+        return live
+
+    def collect_thumbnails(self, cutoff):
+        root = default.storage.location
+        live = self.live_thumbnails()
+        count = size = 0
+        files = self.old_files(
+            os.path.join(root, sorl_settings.THUMBNAIL_PREFIX), cutoff
+        )
+        for entry in files:
+            if self.relative(entry.path, root) in live:
+                continue
+            freed = self.delete(entry.path, cutoff)
+            if freed is not None:
+                count += 1
+                size += freed
+        return count, size
+
+    def collect_uploads(self, cutoff):
+        """Загрузки по частям, в которые давно не приходило частей."""
+        count = size = 0
+        files = self.old_files(settings.CHUNKED_UPLOAD_ROOT, cutoff)
+        for batch in batched(files, self.batch_size):
+            ids = []
+            for entry in batch:
+                freed = self.delete(entry.path, cutoff)
+                if freed is not None:
+                    count += 1
+                    size += freed
+                    ids.append(upload_id(entry.name))
+            if not self.dry_run:
+                ChunkedUpload.objects.filter(pk__in=ids).delete()
+        # сессии, в которые не пришло ни одной части
+        created_before = datetime.fromtimestamp(cutoff, tz=timezone.utc)
+        empty = ChunkedUpload.objects.filter(created__lt=created_before)
+        for batch in batched(empty.iterator(), self.batch_size):
+            abandoned = [
+                upload.pk for upload in batch
+                if not os.path.exists(chunked.part_path(upload))
+            ]
+            count += len(abandoned)
+            if abandoned and not self.dry_run:
+                ChunkedUpload.objects.filter(pk__in=abandoned).delete()
+        return count, size
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from posts.models import Post, StoredFile
+from posts.storage import is_content_name, post_images
+
+
+class Command(BaseCommand):
+    help = 'Переносит картинки постов в хранилище с именами по содержимому'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько картинок нужно перенести',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Не удалять файлы со старыми именами',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.keep_originals = options['keep_originals']
+        moved = posts = missing = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .exclude(image='')
+                .exclude(image__isnull=True)
+                .order_by('pk')
+                .values_list('pk', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            # у нескольких постов может быть одна картинка: она
+            # переносится один раз, вместе со всеми постами
+            names = {name for _, name in batch if not is_content_name(name)}
+            for name in sorted(names):
+                if not post_images.exists(name):
+                    missing += 1
+                    continue
+                moved += 1
+                if not self.dry_run:
+                    posts += self.move(name)
+        self.stdout.write(
+            f'Перенесено картинок: {moved}, постов: {posts}, '
+            f'файлов не найдено: {missing}'
+        )
+
+    def move(self, name):
+        with post_images.open(name) as image:
+            new_name = post_images.save(name, image)
+        with transaction.atomic():
+            updated = Post.objects.filter(image=name).update(image=new_name)
+            StoredFile.objects.get_or_create(name=new_name)
+            StoredFile.objects.filter(name=new_name).update(
+                references=F('references') + updated
+            )
+        if not self.keep_originals:
+            post_images.delete(name)
+        return updated
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, Profile
+
+User = get_user_model()
+
+PROFILE_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+POST_COUNTERS = {
+    'comment_count': (Comment, 'post'),
+}
+
+
+def count_of(model, field, outer):
+    rows = model.objects.filter(**{field: OuterRef(outer)}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(field).annotate(total=Count('*')).values('total'),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сверяет и пересчитывает счётчики профилей и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько счётчиков разошлось',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        created = self.create_missing_profiles()
+        profiles = self.reconcile(Profile, PROFILE_COUNTERS, 'user_id')
+        posts = self.reconcile(Post, POST_COUNTERS, 'pk')
+        self.stdout.write(
+            f'Создано профилей: {created}. Разошлись счётчики '
+            f'профилей: {profiles}, постов: {posts}'
+        )
+
+    def create_missing_profiles(self):
+        missing = User.objects.filter(profile__isnull=True).order_by('pk')
+        if self.dry_run:
+            return missing.count()
+        created = 0
+        while True:
+            batch = list(missing.values_list('pk', flat=True)[
+                :self.batch_size
+            ])
+            if not batch:
+                return created
+            Profile.objects.bulk_create(
+                Profile(user_id=user_id) for user_id in batch
+            )
+            created += len(batch)
+
+    def reconcile(self, model, counters, key):
+        """Пройти model пачками по pk и поправить разошедшиеся счётчики.
+
+        Исправление делается одним UPDATE с подзапросом, поэтому
+        параллельные инкременты через F() не теряются.
+        """
+        drifted = 0
+        last_pk = 0
+        fields = ['pk', key, *counters]
+        while True:
+            batch = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values(*fields)[:self.batch_size]
+            )
+            if not batch:
+                return drifted
+            last_pk = batch[-1]['pk']
+            actual = self.actual_counts(
+                [row[key] for row in batch], counters
+            )
+            wrong = [
+                row['pk'] for row in batch
+                if any(
+                    row[name] != actual[name].get(row[key], 0)
+                    for name in counters
+                )
+            ]
+            drifted += len(wrong)
+            if wrong and not self.dry_run:
+                model.objects.filter(pk__in=wrong).update(**{
+                    name: count_of(source, field, key)
+                    for name, (source, field) in counters.items()
+                })
+
+    def actual_counts(self, keys, counters):
+        actual = {}
+        for name, (source, field) in counters.items():
+            actual[name] = dict(
+                source.objects.filter(**{f'{field}__in': keys})
+                .order_by()
+                .values_list(field)
+                .annotate(total=Count('*'))
+            )
+        return actual
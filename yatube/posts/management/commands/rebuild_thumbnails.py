@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import (
+    ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново строит миниатюры картинок постов в пуле процессов. '
+        'Картинки, у которых манифест построен для текущих размеров, '
+        'пропускаются; прерванный запуск продолжается с контрольной точки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов строят миниатюры; 0 — строить здесь же',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, 'rebuild_thumbnails.json'),
+            help='Файл контрольной точки',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не глядя на контрольную точку',
+        )
+        parser.add_argument(
+            '--report-every',
+            type=float,
+            default=10,
+            help='Как часто (в секундах) печатать прогресс и сохранять '
+                 'контрольную точку',
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        self.report_every = options['report_every']
+        after = '' if options['restart'] else self.load_checkpoint()
+        if after:
+            self.stdout.write(f'Продолжаю после {after}')
+        images = Post.objects.filter(image__gt=after).order_by('image')
+        self.total = images.values('image').distinct().count()
+        self.rebuilt = self.skipped = self.failed = 0
+        # картинки в порядке обхода: контрольная точка сдвигается только
+        # за те, что готовы вместе со всеми предыдущими
+        self.queue = OrderedDict()
+        self.touched = []
+        self.started = self.reported = time.monotonic()
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(workers) if workers else None
+        futures = {}
+        rows = images.values_list(
+            'image', 'image_manifest', 'pk', 'author_id', 'group_id'
+        ).iterator()
+        try:
+            for name, group in groupby(rows, key=itemgetter(0)):
+                group = list(group)
+                self.queue[name] = False
+                if all(thumbnails.is_current(name, row[1]) for row in group):
+                    self.skipped += 1
+                    self.done(name)
+                    continue
+                posts = [
+                    Post(pk=pk, author_id=author_id, group_id=group_id)
+                    for _, _, pk, author_id, group_id in group
+                ]
+                if pool is None:
+                    self.finish(name, posts, thumbnails.render(name))
+                    continue
+                try:
+                    future = pool.submit(thumbnails.render, name)
+                except BrokenProcessPool:
+                    # процесс упал (например, по памяти): картинки, что
+                    # были в работе, засчитаются как ошибки
+                    self.collect(futures)
+                    pool = ProcessPoolExecutor(workers)
+                    future = pool.submit(thumbnails.render, name)
+                futures[future] = (name, posts)
+                # в очереди пула держим немного картинок на процесс, чтобы
+                # не читать из базы всё сразу
+                if len(futures) >= workers * 4:
+                    self.collect(futures, FIRST_COMPLETED)
+            self.collect(futures)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.save_checkpoint(None)
+        self.report('Готово')
+
+    def collect(self, futures, return_when=ALL_COMPLETED):
+        finished, _ = wait(futures, return_when=return_when)
+        for future in finished:
+            name, posts = futures.pop(future)
+            try:
+                manifest = future.result()
+            except Exception as error:
+                self.stderr.write(f'{name}: {error!r}')
+                manifest = None
+            self.finish(name, posts, manifest)
+
+    def finish(self, name, posts, manifest):
+        thumbnails.remember(name, manifest, ())
+        if manifest is None:
+            self.failed += 1
+        else:
+            self.rebuilt += 1
+            self.touched.extend(posts)
+        self.done(name)
+
+    def done(self, name):
+        self.queue[name] = True
+        last = None
+        while self.queue and next(iter(self.queue.values())):
+            last, _ = self.queue.popitem(last=False)
+        if time.monotonic() - self.reported >= self.report_every:
+            if last is not None:
+                self.save_checkpoint(last)
+            self.report('Обработано')
+
+    def report(self, title):
+        self.reported = time.monotonic()
+        processed = self.rebuilt + self.skipped + self.failed
+        rate = processed / max(self.reported - self.started, 1e-6)
+        self.stdout.write(
+            f'{title} картинок: {processed} из {self.total}, построено: '
+            f'{self.rebuilt}, актуальны: {self.skipped}, ошибок: '
+            f'{self.failed}, {rate:.1f} картинок/с'
+        )
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return ''
+        # после смены размеров старая точка не годится
+        if state.get('layout') != thumbnails.LAYOUT:
+            return ''
+        return state.get('after', '')
+
+    def save_checkpoint(self, after):
+        """Запомнить, до какой картинки всё готово; None — всё готово.
+
+        Перед этим сбрасываются поколения лент с обновлёнными постами,
+        чтобы кэш фрагментов не остался со старыми картинками.
+        """
+        if self.touched:
+            caching.bump(*caching.post_scopes(*self.touched))
+            self.touched = []
+        if after is None:
+            if os.path.exists(self.checkpoint):
+                os.remove(self.checkpoint)
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'layout': thumbnails.LAYOUT, 'after': after}, file)
+        os.replace(temporary, self.checkpoint)
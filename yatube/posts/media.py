@@ -0,0 +1,55 @@
+"""Счётчики ссылок на файлы картинок в ContentAddressedStorage.
+
+Одинаковые картинки разных постов хранятся одним файлом, поэтому файл
+можно удалить, только когда на него не ссылается ни один пост.
+Картинки со старыми именами (до переезда в хранилище по содержимому)
+не считаются и не удаляются: их переносит move_post_images.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import StoredFile
+from .storage import is_content_name, post_images
+
+
+def acquire(name, content=None):
+    """Добавить ссылку на файл name.
+
+    content — только что загруженное содержимое файла. Хранилище не
+    пишет файл, который уже есть, и его могли удалить вместе с последней
+    старой ссылкой раньше, чем сюда дошёл новый пост; тогда файл
+    записывается заново.
+    """
+    if not is_content_name(name):
+        return
+    with transaction.atomic():
+        # сначала запись: строка заблокирована до конца транзакции, и
+        # delete_unreferenced не удалит файл между ссылкой и проверкой
+        updated = StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+        if not updated:
+            StoredFile.objects.create(name=name, references=1)
+        if content is not None and not post_images.exists(name):
+            post_images.restore(name, content)
+
+
+def release(name):
+    if not is_content_name(name):
+        return
+    StoredFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+def delete_unreferenced(name):
+    # между release и этим местом картинку могли загрузить заново:
+    # файл удаляется, только если запись о нём всё ещё без ссылок
+    with transaction.atomic():
+        deleted, _ = StoredFile.objects.filter(
+            name=name, references=0
+        ).delete()
+        # файл удаляется под той же блокировкой, что и запись о нём
+        if deleted:
+            post_images.delete(name)
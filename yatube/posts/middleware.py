@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import (cc_delim_re, get_conditional_response,
+                                patch_cache_control)
+from django.utils.http import parse_http_date_safe
+
+from .caching import page_generation
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для анонимных GET-запросов.
+
+    Стоит в начале MIDDLEWARE, поэтому попадание в кэш не трогает ни
+    сессии, ни CSRF, ни базу. Кэшируются только view, обёрнутые в
+    caching.conditional: ключ строится из поколения страницы и полного
+    URL, так что запись поста или комментария сама выводит старые
+    страницы из оборота. Анонимные ответы отдаются без Vary: Cookie и с
+    s-maxage, чтобы их мог держать и обратный прокси; прокси при этом
+    должен пропускать мимо кэша запросы с cookie сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        response = cache.get(key)
+        if response is not None:
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified')
+                ),
+                response=response,
+            )
+        response = self.get_response(request)
+        if self.is_cacheable(response):
+            self.make_public(response)
+            cache.set(key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return response
+
+    def cache_key(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        get_scopes = getattr(match.func, 'page_scopes', None)
+        if get_scopes is None:
+            return None
+        value = page_generation(
+            get_scopes, request, *match.args, **match.kwargs
+        )
+        if not value:
+            return None
+        url = request.build_absolute_uri()
+        return 'page:' + hashlib.md5(f'{value}|{url}'.encode()).hexdigest()
+
+    def is_cacheable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+    def make_public(self, response):
+        if response.has_header('Vary'):
+            vary = [
+                header for header in cc_delim_re.split(response['Vary'])
+                if header.lower() != 'cookie'
+            ]
+            if vary:
+                response['Vary'] = ', '.join(vary)
+            else:
+                del response['Vary']
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=0,
+            s_maxage=settings.ANONYMOUS_PAGE_CACHE_MAX_AGE,
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.6 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunSQL(
+            'INSERT INTO posts_profile '
+            '(user_id, posts_count, followers_count, following_count) '
+            'SELECT u.id, '
+            '(SELECT COUNT(*) FROM posts_post p WHERE p.author_id = u.id), '
+            '(SELECT COUNT(*) FROM posts_follow f WHERE f.author_id = u.id), '
+            '(SELECT COUNT(*) FROM posts_follow f WHERE f.user_id = u.id) '
+            'FROM auth_user u',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'UPDATE posts_post SET comment_count = '
+            '(SELECT COUNT(*) FROM posts_comment c '
+            'WHERE c.post_id = posts_post.id)',
+            migrations.RunSQL.noop,
+        ),
+    ]
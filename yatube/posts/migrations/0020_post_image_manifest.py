@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_manifest',
+            field=models.TextField(blank=True, default='', editable=False, help_text='JSON с адресами миниатюр разных ширин и форматов', verbose_name='Варианты картинки'),
+        ),
+    ]
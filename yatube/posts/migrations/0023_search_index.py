@@ -0,0 +1,43 @@
+from django.db import migrations
+
+TOKENIZER = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+
+def index_sql(table):
+    index = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE {index} USING fts5(text, "
+        f"content = '{table}', content_rowid = 'id', {TOKENIZER})",
+        f'CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END',
+        f'CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); END",
+        f'CREATE TRIGGER {index}_update AFTER UPDATE OF text ON {table} '
+        f"BEGIN INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END',
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(table):
+    index = f'{table}_fts'
+    return [
+        f'DROP TRIGGER IF EXISTS {index}_insert',
+        f'DROP TRIGGER IF EXISTS {index}_delete',
+        f'DROP TRIGGER IF EXISTS {index}_update',
+        f'DROP TABLE IF EXISTS {index}',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.RunSQL(index_sql(table), drop_sql(table))
+        for table in ('posts_post', 'posts_comment')
+    ]
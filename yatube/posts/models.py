@@ -1,9 +1,20 @@
+import math
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_images
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что нужно includes/post_item.html, одним запросом."""
+        return self.select_related('author', 'group')
+
+
 class Group(models.Model):
     title = models.CharField(
         'Название группы',
@@ -52,12 +63,41 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=post_images,
         blank=True,
         null=True
     )
+    image_manifest = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='JSON с адресами миниатюр разных ширин и форматов',
+    )
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -94,6 +134,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -110,6 +156,11 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+    fanout = models.BooleanField(
+        'Доставка в ленту',
+        default=True,
+        help_text='Новые посты автора раскладываются в ленту подписчика',
+    )
 
     class Meta:
         constraints = [
@@ -121,3 +172,195 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'user: {self.user.username} author: {self.author.username}'
+
+
+class PostTag(models.Model):
+    """Хэштег поста: строка инвертированного индекса «тег → посты».
+
+    pub_date повторяет дату поста, чтобы лента тега читалась одним
+    диапазоном по индексу (tag, pub_date).
+    """
+    tag = models.CharField('Хэштег', max_length=100)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tags',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='post_tag_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'],
+                name='unique_post_tags'
+            )
+        ]
+
+    def __str__(self):
+        return f'#{self.tag} post: {self.post_id}'
+
+
+class PostMention(models.Model):
+    """Упоминание пользователя в посте через @имя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='post_mention_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_post_mentions'
+            )
+        ]
+
+    def __str__(self):
+        return f'@{self.user_id} post: {self.post_id}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entries'
+            )
+        ]
+
+    def __str__(self):
+        return f'user: {self.user_id} post: {self.post_id}'
+
+
+class Profile(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*).
+
+    Обновляются сигналами через F(), а расхождения исправляет команда
+    rebuild_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return f'profile: {self.user_id}'
+
+
+def get_profile(user):
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        return Profile.objects.get_or_create(user=user)[0]
+
+
+class StoredFile(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ChunkedUpload(models.Model):
+    """Картинка, которую клиент загружает по частям.
+
+    Части приходят отдельными короткими PUT в любом порядке и сколько
+    угодно раз; после обрыва клиент спрашивает, каких частей не хватает,
+    и докачивает только их.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+    )
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveIntegerField('Размер файла')
+    chunk_size = models.PositiveIntegerField('Размер части')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @property
+    def chunks(self):
+        return math.ceil(self.size / self.chunk_size)
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def missing(self):
+        received = set(self.parts.values_list('index', flat=True))
+        return [index for index in range(self.chunks) if index not in received]
+
+    def __str__(self):
+        return f'{self.filename} ({self.user_id})'
+
+
+class ChunkedUploadPart(models.Model):
+    upload = models.ForeignKey(
+        ChunkedUpload,
+        on_delete=models.CASCADE,
+        related_name='parts',
+    )
+    index = models.PositiveIntegerField('Номер части')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['upload', 'index'],
+                name='unique_upload_part',
+            ),
+        ]
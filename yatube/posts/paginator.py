@@ -0,0 +1,228 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import generation
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    values = [
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in values
+    ]
+    raw = json.dumps([direction, *values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding)
+        direction, *values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def keyset_q(fields, values, reverse=False):
+    """Условие «строго после позиции» для сортировки по fields.
+
+    Для ('pub_date', 'id') по убыванию это
+    pub_date <= x AND (pub_date < x OR (pub_date = x AND id < y)).
+    Первое слагаемое дублирует условие, зато даёт индексу границу
+    диапазона: на OR SQLite сам её не выводит.
+    """
+    lookup = 'gt' if reverse else 'lt'
+    condition = Q()
+    equal = {}
+    for field, value in zip(fields, values):
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    return Q(**{f'{fields[0]}__{lookup}e': values[0]}) & condition
+
+
+def keyset_slice(queryset, ordering, values, reverse, limit):
+    fields = [name.lstrip('-') for name in ordering]
+    if values is not None:
+        queryset = queryset.filter(keyset_q(fields, values, reverse))
+    objects = list(
+        queryset.order_by(*(fields if reverse else ordering))[:limit]
+    )
+    if reverse:
+        objects.reverse()
+    return objects
+
+
+class CountCachedPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) на каждый показ.
+
+    Число объектов берётся из готового счётчика (count=) или из кэша под
+    поколением лент count_scopes, так что запись поста сбрасывает его
+    сама. Считается не дальше PAGINATION_COUNT_THRESHOLD: если объектов
+    больше, число помечается как оценка и выводится как «10 000+».
+    """
+
+    def __init__(self, object_list, per_page, count=None, count_scopes=(),
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.count_scopes = count_scopes
+        self.threshold = settings.PAGINATION_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if not self.count_scopes:
+            return self.bounded_count()
+        value = generation(*self.count_scopes)
+        key = 'count:' + hashlib.md5(value.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.bounded_count()
+            cache.set(key, count, settings.PAGINATION_COUNT_TIMEOUT)
+        return count
+
+    def bounded_count(self):
+        return self.object_list.order_by()[:self.threshold + 1].count()
+
+    @property
+    def estimated(self):
+        return self.count > self.threshold
+
+    @property
+    def display_count(self):
+        count = min(self.count, self.threshold)
+        text = f'{count:,}'.replace(',', ' ')
+        return f'{text}+' if self.estimated else text
+
+
+class CursorPaginator(CountCachedPaginator):
+    """Пагинация по ключу (pub_date, id) без COUNT и OFFSET.
+
+    Страницы адресуются непрозрачным токеном ?cursor=, старый ?page=N
+    поддерживается для совместимости, но не глубже max_page. Номера
+    страниц для навигации считаются по кэшированному числу объектов.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, max_page=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if max_page is None:
+            max_page = settings.PAGINATION_MAX_PAGE
+        self.max_page = max_page
+
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, self.max_page) + 1)
+
+    @property
+    def fields(self):
+        return tuple(name.lstrip('-') for name in self.ordering)
+
+    def position(self, obj):
+        return tuple(getattr(obj, field) for field in self.fields)
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                direction, values = self.parse_cursor(cursor)
+            except InvalidCursor:
+                return self.first_page()
+            return self.cursor_page(direction, values)
+        if number:
+            return self.legacy_page(number)
+        return self.first_page()
+
+    def parse_cursor(self, token):
+        direction, values = decode_cursor(token)
+        if len(values) != len(self.fields):
+            raise InvalidCursor(token)
+        model = self.object_list.model
+        try:
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor(token)
+        if None in values:
+            raise InvalidCursor(token)
+        return direction, values
+
+    def fetch(self, values, reverse, limit):
+        """Вернуть до limit объектов после позиции values.
+
+        Объекты всегда возвращаются в порядке отображения ленты.
+        """
+        return keyset_slice(
+            self.object_list, self.ordering, values, reverse, limit
+        )
+
+    def first_page(self):
+        objects = self.fetch(None, False, self.per_page + 1)
+        has_next = len(objects) > self.per_page
+        return self.build_page(objects[:self.per_page], 1, has_next, False)
+
+    def cursor_page(self, direction, values):
+        if direction == NEXT:
+            objects = self.fetch(values, False, self.per_page + 1)
+            has_next = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+            has_previous = True
+        else:
+            objects = self.fetch(values, True, self.per_page + 1)
+            has_previous = len(objects) > self.per_page
+            objects = objects[-self.per_page:]
+            has_next = True
+        if not objects:
+            return self.first_page()
+        return self.build_page(objects, None, has_next, has_previous)
+
+    def legacy_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = self.num_pages
+        page = super().page(min(number, self.max_page))
+        page.object_list = list(page.object_list)
+        return self.build_page(
+            page.object_list,
+            page.number,
+            page.has_next(),
+            page.has_previous(),
+        )
+
+    def build_page(self, objects, number, has_next, has_previous):
+        page = Page(objects, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if objects and has_next:
+            page.next_cursor = encode_cursor(
+                NEXT, self.position(objects[-1])
+            )
+        if objects and has_previous:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, self.position(objects[0])
+            )
+        return page
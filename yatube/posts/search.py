@@ -0,0 +1,193 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Тексты постов и комментариев зеркалируются в таблицы FTS5 с внешним
+содержимым (posts_post_fts, posts_comment_fts): сам текст хранится
+только в исходной таблице, а индекс обновляют триггеры, так что он
+не отстаёт даже от bulk_create и update(). Запрос пользователя не
+передаётся в MATCH как есть: из него берутся слова, и каждое ищется
+как префикс, чтобы «котик» находил «котики» и «котиков».
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.expressions import RawSQL
+
+from .paginator import CursorPaginator, InvalidCursor, decode_cursor
+
+# столько слов запроса учитывается, остальные отбрасываются
+MAX_TERMS = 8
+# совпадение в комментарии весит меньше, чем в самом посте
+COMMENT_WEIGHT = 0.5
+WORD = re.compile(r'\w+')
+
+INDEXES = {
+    'posts_post_fts': 'posts_post',
+    'posts_comment_fts': 'posts_comment',
+}
+TRIGGERS = {
+    'insert': (
+        'AFTER INSERT ON {table} BEGIN '
+        'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END'
+    ),
+    'delete': (
+        'AFTER DELETE ON {table} BEGIN '
+        "INSERT INTO {index}({index}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); END"
+    ),
+    'update': (
+        'AFTER UPDATE OF text ON {table} BEGIN '
+        "INSERT INTO {index}({index}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END'
+    ),
+}
+
+RESULTS = f'''
+    SELECT post_id, MIN(rank) AS rank FROM (
+        SELECT rowid AS post_id, bm25(posts_post_fts) AS rank
+        FROM posts_post_fts WHERE posts_post_fts MATCH %s
+        UNION ALL
+        SELECT comment.post_id, bm25(posts_comment_fts) * {COMMENT_WEIGHT}
+        FROM posts_comment_fts
+        JOIN posts_comment AS comment
+            ON comment.id = posts_comment_fts.rowid
+        WHERE posts_comment_fts MATCH %s AND comment.post_id IS NOT NULL
+    ) GROUP BY post_id
+'''
+
+
+def match_query(text):
+    """Запрос FTS5 из произвольной строки или '' для пустой."""
+    terms = WORD.findall(text.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def installed(using=DEFAULT_DB_ALIAS):
+    if connections[using].vendor != 'sqlite':
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            ['posts_post_fts'],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_index(using=DEFAULT_DB_ALIAS):
+    """Вернуть триггеры, если их снесла перестройка таблицы.
+
+    SQLite меняет схему, пересоздавая таблицу, и триггеры пропадают
+    вместе со старой. Тогда индекс заполняется заново.
+    """
+    if not installed(using):
+        return
+    with connections[using].cursor() as cursor:
+        for index, table in INDEXES.items():
+            names = [f'{index}_{event}' for event in TRIGGERS]
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master "
+                "WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                names,
+            )
+            if cursor.fetchone()[0] == len(names):
+                continue
+            for event, body in TRIGGERS.items():
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {index}_{event} '
+                    + body.format(index=index, table=table)
+                )
+            cursor.execute(
+                f"INSERT INTO {index}({index}) VALUES ('rebuild')"
+            )
+
+
+def connect(sender, connection, **kwargs):
+    """Приёмник connection_created: заранее подключить таблицы FTS5.
+
+    FTS5 читает свои настройки при первом обращении соединения к
+    таблице. Если это случается внутри триггера на INSERT, соединение
+    уже держит снимок для чтения, и при занятой базе запись получает
+    «database is locked» сразу, не дожидаясь busy_timeout.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for index in INDEXES:
+        try:
+            connection.connection.execute(f'SELECT 1 FROM {index} LIMIT 0')
+        except connection.Database.OperationalError:
+            # до миграций таблиц ещё нет
+            return
+
+
+def matching(queryset, text):
+    """Строки queryset (посты или комментарии), где встречается text.
+
+    Для админки: сортировку и пагинацию она делает сама.
+    """
+    query = match_query(text)
+    if not query:
+        return queryset.none()
+    index = f'{queryset.model._meta.db_table}_fts'
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {index} WHERE {index} MATCH %s', [query]
+    ))
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по релевантности с курсором (rank, id).
+
+    Релевантность — bm25 (чем меньше, тем лучше), поэтому обе части
+    ключа идут по возрастанию. Номеров страниц у поиска нет.
+    """
+    ordering = ('rank', 'post_id')
+
+    def __init__(self, object_list, per_page, text, **kwargs):
+        super().__init__(object_list, per_page, max_page=1, **kwargs)
+        self.query = match_query(text)
+
+    def get_page(self, number=None, cursor=None):
+        return super().get_page(None, cursor)
+
+    def parse_cursor(self, token):
+        direction, values = decode_cursor(token)
+        if (len(values) != 2 or not isinstance(values[0], (int, float))
+                or not isinstance(values[1], int)):
+            raise InvalidCursor(token)
+        return direction, values
+
+    def position(self, obj):
+        return obj.search_rank, obj.pk
+
+    def fetch(self, values, reverse, limit):
+        if not self.query:
+            return []
+        sql = f'SELECT post_id, rank FROM ({RESULTS})'
+        params = [self.query, self.query]
+        if values is not None:
+            sign = '<' if reverse else '>'
+            sql += (
+                f' WHERE rank {sign} %s OR (rank = %s AND post_id {sign} %s)'
+            )
+            params += [values[0], values[0], values[1]]
+        order = 'DESC' if reverse else 'ASC'
+        sql += f' ORDER BY rank {order}, post_id {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = dict(cursor.fetchall())
+        posts = self.object_list.in_bulk(list(ranks))
+        ordered = []
+        for pk, rank in ranks.items():
+            if pk in posts:
+                posts[pk].search_rank = rank
+                ordered.append(posts[pk])
+        if reverse:
+            ordered.reverse()
+        return ordered
+
+    @property
+    def count(self):
+        return 0
+
+    def build_page(self, objects, number, has_next, has_previous):
+        return super().build_page(objects, None, has_next, has_previous)
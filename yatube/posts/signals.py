@@ -0,0 +1,146 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, caching, hashtags, media, search, timeline
+from .models import Comment, Follow, Group, Post, Profile
+
+User = get_user_model()
+
+
+def change_counter(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+def migrated(sender, using, **kwargs):
+    # кэш переживает процесс, а после миграций поколения в нём могут
+    # описывать уже другую базу (например, свежую тестовую)
+    cache.clear()
+    search.ensure_index(using)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, update_fields, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+        caching.bump(f'author:{instance.pk}')
+    # вход в систему сохраняет только last_login, подсказкам это не важно
+    if update_fields is None or {'username', 'is_active'} & update_fields:
+        transaction.on_commit(lambda: autocomplete.user_changed(instance))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.user_deleted(pk))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    caching.bump(f'group:{instance.pk}')
+    transaction.on_commit(lambda: autocomplete.group_changed(instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.group_deleted(pk))
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = None
+    instance._previous_text = None
+    # содержимое новой картинки: после сохранения поля остаётся только имя
+    instance._image_content = (
+        instance.image.file
+        if instance.image and not instance.image._committed else None
+    )
+    if instance.pk:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image', 'text'
+        ).first()
+        if previous is not None:
+            (instance._previous_group_id, instance._previous_image,
+             instance._previous_text) = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Profile.objects.filter(user_id=instance.author_id),
+            'posts_count', 1,
+        )
+        timeline.fan_out(instance)
+    if (instance.image.name or None) != (instance._previous_image or None):
+        media.acquire(instance.image.name, instance._image_content)
+        media.release(instance._previous_image)
+    if instance.text != instance._previous_text:
+        hashtags.index_post(instance)
+    caching.bump_post(instance, [instance._previous_group_id])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_counter(
+        Profile.objects.filter(user_id=instance.author_id),
+        'posts_count', -1,
+    )
+    media.release(instance.image.name)
+    caching.bump_post(instance)
+
+
+def comments_changed(comment, delta):
+    posts = Post.objects.filter(pk=comment.post_id)
+    change_counter(posts, 'comment_count', delta)
+    post = posts.first()
+    if post is not None:
+        caching.bump_post(post)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        comments_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    comments_changed(instance, -1)
+
+
+def change_follow_counters(follow, delta):
+    change_counter(
+        Profile.objects.filter(user_id=follow.author_id),
+        'followers_count', delta,
+    )
+    change_counter(
+        Profile.objects.filter(user_id=follow.user_id),
+        'following_count', delta,
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_follow_counters(instance, 1)
+        timeline.subscribe(instance)
+        caching.bump(
+            f'follow:{instance.user_id}', f'author:{instance.author_id}'
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_follow_counters(instance, -1)
+    timeline.unsubscribe(instance)
+    caching.bump(
+        f'follow:{instance.user_id}', f'author:{instance.author_id}'
+    )
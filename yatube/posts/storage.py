@@ -0,0 +1,101 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл называется SHA-256 своего содержимого и лежит в двух уровнях
+подкаталогов по первым символам хэша: posts/ab/cd/abcd….jpg. Повторная
+загрузка той же картинки ничего не пишет на диск, а каталоги не
+разрастаются до миллионов записей. Сколько постов ссылается на файл,
+считает StoredFile (см. posts.media).
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(
+    r'(?:.+/)?(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P=a)(?P=b)[0-9a-f]{60}'
+    r'(?:\.\w+)?'
+)
+
+
+def content_name(directory, digest, extension):
+    return os.path.join(
+        directory, digest[:2], digest[2:4], digest + extension.lower()
+    )
+
+
+def is_content_name(name):
+    return bool(name) and CONTENT_NAME.fullmatch(name) is not None
+
+
+def touch(storage, name):
+    """Обновить время изменения файла, который снова понадобился.
+
+    collect_media удаляет только давно не менявшиеся файлы, так что
+    файл, на который вот-вот сошлются, он не тронет.
+    """
+    try:
+        os.utime(storage.path(name))
+    except (NotImplementedError, OSError):
+        pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # настоящее имя станет известно только после чтения содержимого
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1]
+        return self._store(
+            content,
+            lambda digest: content_name(directory, digest, extension),
+        )
+
+    def restore(self, name, content):
+        """Записать заново файл name с содержимым content.
+
+        Нужен, когда файл удалили вместе с последней ссылкой на него,
+        пока новый пост с той же картинкой ещё сохранялся.
+        """
+        return self._store(content, lambda digest: name)
+
+    def _store(self, content, get_name):
+        """Записать content во временный файл, по пути считая хэш.
+
+        Файл читается один раз и кусками, так что память не зависит от
+        размера картинки. Если такой файл уже есть, временный просто
+        удаляется; иначе он атомарно переименовывается на место.
+        """
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(
+            dir=self.location, prefix='.upload-'
+        )
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = get_name(digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                touch(self, name)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            # одинаковое содержимое под одинаковым именем: гонка двух
+            # загрузок безопасна, победит любая
+            os.replace(temporary, full_path)
+            return name
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,21 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def post_picture(post, geometry):
+    width, height = (int(side) for side in geometry.split('x'))
+    return {
+        'picture': thumbnails.picture(post, geometry),
+        'ratio': f'{height / width:.2%}',
+        'max_width': width,
+    }
+
+
+@register.simple_tag
+def prefetch_pictures(posts, geometry):
+    thumbnails.prefetch(posts, geometry)
+    return ''
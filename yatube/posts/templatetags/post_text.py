@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from posts import hashtags
+
+register = template.Library()
+
+
+@register.filter(is_safe=True)
+def link_tags(text):
+    """Текст поста с проиндексированными #тегами в виде ссылок на ленты."""
+    parts = []
+    start = 0
+    for match, tag in hashtags.tag_matches(text):
+        parts.append(escape(text[start:match.start()]))
+        parts.append(format_html(
+            '<a href="{}">#{}</a>',
+            reverse('tag_posts', args=[tag]),
+            match.group(1),
+        ))
+        start = match.end()
+    parts.append(escape(text[start:]))
+    return mark_safe(''.join(parts))
@@ -0,0 +1,120 @@
+import random
+import string
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from posts import autocomplete
+from posts.models import Group, User
+
+
+@override_settings(AUTOCOMPLETE_CHECK_INTERVAL=3600)
+class AutocompleteTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.leo = User.objects.create_user(username='leo')
+        User.objects.create_user(username='leonid')
+        User.objects.create_user(username='Лёша')
+        self.group = Group.objects.create(
+            title='Любители котиков', slug='cats', description='Мяу'
+        )
+        # индекс общий на процесс: новая эпоха журнала заставит его
+        # перечитать базу
+        autocomplete.new_epoch()
+        autocomplete.autocomplete.checked = 0
+
+    def suggest(self, query, **params):
+        response = self.client.get(
+            reverse('autocomplete'), {'q': query, **params}
+        )
+        return [
+            (result['type'], result['label'], result['url'])
+            for result in response.json()['results']
+        ]
+
+    def labels(self, query):
+        return [label for _, label, _ in self.suggest(query)]
+
+    def test_prefixes_of_names_slugs_and_title_words(self):
+        self.assertEqual(
+            self.suggest('LE'),
+            [('user', 'leo', '/leo/'), ('user', 'leonid', '/leonid/')],
+        )
+        self.assertEqual(self.labels('леш'), ['Лёша'])
+        group = [('group', 'Любители котиков', '/group/cats/')]
+        self.assertEqual(self.suggest('кот'), group)
+        self.assertEqual(self.suggest('ca'), group)
+        self.assertEqual(self.suggest('любители к'), group)
+        self.assertEqual(len(self.suggest('le', limit=1)), 1)
+        self.assertEqual(self.suggest(''), [])
+
+    def test_changes_of_this_process_are_applied_in_place(self):
+        self.labels('le')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('lev'), [])
+        User.objects.create_user(username='lev')
+        self.group.title = 'Собачники'
+        self.group.save()
+        self.leo.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('le'), ['leonid', 'lev'])
+            self.assertEqual(self.labels('кот'), [])
+            self.assertEqual(self.labels('соб'), ['Собачники'])
+
+    @override_settings(AUTOCOMPLETE_CHECK_INTERVAL=0)
+    def test_changes_of_other_processes_are_replayed_from_the_log(self):
+        self.labels('le')
+        # другой процесс: свой индекс, общий только кэш
+        other = autocomplete.Autocomplete()
+        other.changed(
+            autocomplete.USER, self.leo.pk, autocomplete.user_keys('lena'),
+            'lena',
+        )
+        other.changed(autocomplete.GROUP, self.group.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('le'), ['lena', 'leonid'])
+            self.assertEqual(self.labels('кот'), [])
+
+    @override_settings(AUTOCOMPLETE_CHECK_INTERVAL=0)
+    def test_lost_log_rebuilds_the_index(self):
+        self.labels('le')
+        # так выглядит запись из другого процесса: сигналов здесь нет
+        User.objects.filter(username='leonid').update(username='lena')
+        self.assertEqual(self.labels('le'), ['leo', 'leonid'])
+        autocomplete.Autocomplete().changed(autocomplete.USER, self.leo.pk)
+        epoch = cache.get(autocomplete.LOG)
+        last = cache.get(autocomplete.last_key(epoch))
+        cache.delete(autocomplete.entry_key(epoch, last))
+        self.assertEqual(self.labels('le'), ['lena', 'leo'])
+
+    def test_login_does_not_touch_the_log(self):
+        epoch = cache.get(autocomplete.LOG)
+        last = cache.get(autocomplete.last_key(epoch))
+        self.client.force_login(self.leo)
+        self.assertEqual(cache.get(autocomplete.LOG), epoch)
+        self.assertEqual(cache.get(autocomplete.last_key(epoch)), last)
+
+
+class PrefixIndexTest(SimpleTestCase):
+    def test_lookup_takes_well_under_a_millisecond(self):
+        generator = random.Random(0)
+        index = autocomplete.PrefixIndex()
+        index.load(
+            (autocomplete.USER, pk, {name}, name)
+            for pk, name in enumerate(
+                ''.join(generator.choices(string.ascii_lowercase, k=8))
+                for _ in range(100000)
+            )
+        )
+        index.add(autocomplete.USER, -1, {'zzzz9'}, 'zzzz9')
+        prefixes = [
+            ''.join(generator.choices(string.ascii_lowercase, k=length))
+            for length in (1, 2, 3) * 300
+        ]
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.lookup(prefix, 10)
+        elapsed = (time.perf_counter() - started) / len(prefixes)
+        self.assertLess(elapsed, 0.0005)
+        self.assertEqual(index.lookup('zzzz9', 10), [('user', 'zzzz9')])
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+from yatube.sqlite_cache import SQLiteCache
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def increment(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('hits')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_add_keeps_existing_value(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set('key', 1, timeout=0.05)
+        self.assertTrue(self.cache.has_key('key'))
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 2))
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(
+            self.cache.get_many(['a', 'c', 'missing']), {'a': 1, 'c': 3}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'c': 3})
+
+    def test_incr(self):
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        self.assertEqual(self.cache.decr('counter'), 14)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_instances(self):
+        other = make_cache(self.path)
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_least_recently_read_entries_are_evicted(self):
+        cache = SQLiteCache(self.path, {
+            'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 100}
+        })
+        for number in range(4):
+            cache.set(number, number)
+        # ключ 0 записан первым, но прочитан последним
+        last_read = {0: 3, 1: 0, 2: 1, 3: 2}
+        cache.connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ?',
+            [(at, cache.make_key(key)) for key, at in last_read.items()],
+        )
+        cache.cull()
+        self.assertEqual(cache.get_many(range(4)), {0: 0, 2: 2, 3: 3})
+
+    def test_read_does_not_wait_for_a_busy_writer(self):
+        self.cache.set('key', 'value')
+        self.cache.connection.execute(
+            'UPDATE cache SET accessed = 0 WHERE key = ?',
+            (self.cache.make_key('key'),),
+        )
+        writer = make_cache(self.path).connection
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.perf_counter()
+            self.assertEqual(self.cache.get('key'), 'value')
+            self.assertLess(time.perf_counter() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+        # база освободилась: следующее чтение отметку уже ставит
+        self.cache.get('key')
+        accessed = self.cache.connection.execute(
+            'SELECT accessed FROM cache WHERE key = ?',
+            (self.cache.make_key('key'),),
+        ).fetchone()[0]
+        self.assertGreater(accessed, 0)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('hits', 0)
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('hits'), 200)
@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files import File
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import chunked
+from posts.models import ChunkedUpload, Post, User
+from posts.storage import is_content_name, post_images
+
+MEDIA_ROOT = tempfile.mkdtemp()
+UPLOAD_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+    shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+
+def png_bytes():
+    buffer = BytesIO()
+    Image.new('RGB', (120, 80), (200, 40, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CHUNKED_UPLOAD_ROOT=UPLOAD_ROOT,
+    CHUNKED_UPLOAD_CHUNK_SIZE=100,
+    THUMBNAIL_WORKERS=0,
+)
+class ChunkedUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+        cls.other = User.objects.create_user(username='stranger')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.content = png_bytes()
+
+    def start(self):
+        response = self.client.post(
+            reverse('upload_start'),
+            {'filename': 'photo.png', 'size': len(self.content)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, upload, index, data=None):
+        if data is None:
+            data = self.content[index * 100:(index + 1) * 100]
+        return self.client.put(
+            reverse('upload_chunk', args=[upload['id'], index]),
+            data,
+            content_type='application/octet-stream',
+        )
+
+    def status(self, upload):
+        url = reverse('upload_status', args=[upload['id']])
+        return self.client.get(url).json()
+
+    def test_chunks_arrive_in_any_order_and_repeat(self):
+        upload = self.start()
+        chunks = upload['chunks']
+        self.assertGreater(chunks, 2)
+        self.assertEqual(self.status(upload)['missing'], list(range(chunks)))
+
+        for index in reversed(range(1, chunks)):
+            self.assertEqual(self.put(upload, index).status_code, 200)
+        self.assertEqual(self.put(upload, 1).status_code, 200)
+        self.assertEqual(
+            self.status(upload), {'missing': [0], 'complete': False}
+        )
+        self.assertEqual(
+            self.put(upload, 0).json(), {'missing': [], 'complete': True}
+        )
+
+    def test_bad_chunks_are_rejected(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload, 0, b'short').status_code, 400)
+        self.assertEqual(self.put(upload, 999, b'x').status_code, 400)
+        response = self.client.put(
+            reverse('upload_chunk', args=[upload['id'], 0]),
+            self.content[:100],
+            content_type='application/octet-stream',
+            CONTENT_LENGTH='сто',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(self.other)
+        self.assertEqual(self.put(upload, 0).status_code, 404)
+
+    def test_post_refers_to_finished_upload(self):
+        upload = self.start()
+        for index in range(upload['chunks']):
+            self.put(upload, index)
+        with mock.patch.object(
+            chunked.AssembledUpload, 'close',
+            autospec=True, side_effect=File.close,
+        ) as close:
+            response = self.client.post(
+                reverse('new_post'),
+                {'text': 'Докачано', 'upload_id': upload['id']},
+            )
+        close.assert_called_once()
+        self.assertRedirects(response, reverse('index'))
+        post = Post.objects.get(text='Докачано')
+        self.assertTrue(is_content_name(post.image.name))
+        with post_images.open(post.image.name) as image:
+            self.assertEqual(Image.open(image).size, (120, 80))
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_incomplete_upload_is_a_form_error(self):
+        upload = self.start()
+        self.put(upload, 0)
+        response = self.client.post(
+            reverse('new_post'),
+            {'text': 'Рано', 'upload_id': upload['id']},
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка загружена ещё не целиком'
+        )
+        self.assertFalse(Post.objects.filter(text='Рано').exists())
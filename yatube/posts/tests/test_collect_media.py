@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from posts import chunked, thumbnails
+from posts.models import ChunkedUpload, Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+UPLOAD_ROOT = tempfile.mkdtemp()
+WEEK_AGO = time.time() - 8 * 24 * 60 * 60
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+    shutil.rmtree(UPLOAD_ROOT, ignore_errors=True)
+
+
+def write(path, content=b'x', mtime=WEEK_AGO):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def age(root):
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            os.utime(path, (WEEK_AGO, WEEK_AGO))
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CHUNKED_UPLOAD_ROOT=UPLOAD_ROOT,
+    THUMBNAIL_WORKERS=0,
+)
+class CollectMediaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='janitor')
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 700), (10, 90, 10)).save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            text='Живой пост',
+            author=user,
+            image=SimpleUploadedFile('live.png', buffer.getvalue()),
+        )
+        thumbnails.submit(self.post.image.name, ())
+        self.post.refresh_from_db()
+        age(MEDIA_ROOT)
+
+        self.live = os.path.join(MEDIA_ROOT, self.post.image.name)
+        self.legacy = write(os.path.join(MEDIA_ROOT, 'posts/legacy.png'))
+        Post.objects.create(
+            text='Старый', author=user, image='posts/legacy.png'
+        )
+        self.orphan = write(os.path.join(MEDIA_ROOT, 'posts/orphan.png'))
+        self.fresh = write(
+            os.path.join(MEDIA_ROOT, 'posts/fresh.png'), mtime=time.time()
+        )
+        self.temporary = write(os.path.join(MEDIA_ROOT, '.upload-crashed'))
+        self.stale_thumbnail = write(
+            os.path.join(MEDIA_ROOT, 'cache/00/00/stale.jpg')
+        )
+        self.live_thumbnails = [
+            os.path.join(MEDIA_ROOT, name)
+            for name in thumbnails.manifest_files(self.post.image_manifest)
+        ]
+
+        self.abandoned = chunked.start(user, 'big.jpg', 10)
+        write(chunked.part_path(self.abandoned))
+        self.empty = chunked.start(user, 'empty.jpg', 10)
+        ChunkedUpload.objects.filter(pk=self.empty.pk).update(
+            created=timezone.now() - timedelta(days=3)
+        )
+        self.active = chunked.start(user, 'active.jpg', 10)
+        write(chunked.part_path(self.active), mtime=time.time())
+
+    def collect(self, **options):
+        out = StringIO()
+        call_command('collect_media', rate=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.collect(dry_run=True)
+        self.assertIn('Картинок будет удалено: 2', output)
+        self.assertIn('миниатюр будет удалено: 1', output)
+        self.assertIn('загрузок будет удалено: 2', output)
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertEqual(ChunkedUpload.objects.count(), 3)
+
+    def test_only_unreferenced_old_files_are_deleted(self):
+        self.assertEqual(len(self.live_thumbnails), 6)
+        self.collect()
+        for path in (self.orphan, self.temporary, self.stale_thumbnail):
+            self.assertFalse(os.path.exists(path), path)
+        for path in (self.live, self.legacy, self.fresh,
+                     *self.live_thumbnails):
+            self.assertTrue(os.path.exists(path), path)
+        self.assertEqual(
+            list(ChunkedUpload.objects.values_list('pk', flat=True)),
+            [self.active.pk],
+        )
@@ -0,0 +1,115 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from posts.hashtags import MAX_TAGS, TAG_LENGTH, parse_mentions, parse_tags
+from posts.models import Post, PostMention, PostTag
+from posts.templatetags.post_text import link_tags
+
+User = get_user_model()
+
+
+class HashtagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.leo = User.objects.create_user(username='leo.k')
+
+    def tag_page(self, tag, **params):
+        return self.client.get(reverse('tag_posts', args=[tag]), params)
+
+    def test_parsing(self):
+        self.assertEqual(
+            parse_tags('#Котики и #ёлка, #котики#2020 #1 a#b'),
+            ['котики', 'елка'],
+        )
+        self.assertEqual(
+            parse_mentions('Привет, @leo.k. И @anna! e@mail'),
+            ['leo.k', 'anna'],
+        )
+
+    def test_only_indexed_tags_are_linked(self):
+        long_tag = 'я' * (TAG_LENGTH + 1)
+        extra = [f'тег{number}' for number in range(MAX_TAGS + 1)]
+        text = ' '.join(['#' + long_tag] + ['#' + tag for tag in extra])
+        text += ' #тег0'
+        tags = parse_tags(text)
+        self.assertEqual(tags, extra[:MAX_TAGS])
+        html = link_tags(text)
+        self.assertEqual(html.count('<a '), MAX_TAGS + 1)
+        self.assertNotIn(f'>#{long_tag}<', html)
+        self.assertNotIn(f'>#{extra[-1]}<', html)
+
+    def test_tags_and_mentions_follow_post_text(self):
+        post = Post.objects.create(
+            text='#Котики для @leo.k и @nobody', author=self.author
+        )
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag', 'pub_date')),
+            [('котики', post.pub_date)],
+        )
+        self.assertEqual(
+            list(PostMention.objects.values_list('user', flat=True)),
+            [self.leo.pk],
+        )
+        post.text = '#собаки'
+        post.save()
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag', flat=True)), ['собаки']
+        )
+        self.assertFalse(PostMention.objects.exists())
+
+    def test_tag_page_is_paginated_like_group_page(self):
+        posts = [
+            Post.objects.create(text=f'#котики {number}', author=self.author)
+            for number in range(12)
+        ]
+        Post.objects.create(text='без тега', author=self.author)
+        response = self.tag_page('Котики')
+        page = response.context['page']
+        self.assertEqual(list(page), posts[::-1][:10])
+        self.assertEqual(response.context['paginator'].count, 12)
+        link = reverse('tag_posts', args=['котики'])
+        self.assertContains(response, f'href="{link}"')
+        second = self.tag_page('котики', cursor=page.next_cursor)
+        self.assertEqual(list(second.context['page']), posts[1::-1])
+        self.assertEqual(
+            list(self.tag_page('котики', page=2).context['page']),
+            posts[1::-1],
+        )
+
+    def test_tag_and_index_counts_are_cached_apart(self):
+        for number in range(18):
+            text = f'#кот {number}' if number % 3 else f'Пост {number}'
+            Post.objects.create(text=text, author=self.author)
+        for first, second in (('tag', 'index'), ('index', 'tag')):
+            with self.subTest(first=first):
+                cache.clear()
+                pages = {
+                    name: (
+                        self.tag_page('кот') if name == 'tag'
+                        else self.client.get(reverse('index'))
+                    ).context['paginator']
+                    for name in (first, second)
+                }
+                self.assertEqual(pages['tag'].count, 12)
+                self.assertEqual(pages['index'].count, 18)
+                self.assertEqual(list(pages['index'].page_range), [1, 2])
+
+    def test_backfill(self):
+        post = Post.objects.create(text='#котики @leo.k', author=self.author)
+        PostTag.objects.all().delete()
+        PostMention.objects.all().delete()
+        PostTag.objects.create(tag='лишний', post=post, pub_date=post.pub_date)
+        out = StringIO()
+        call_command('backfill_tags', batch_size=1, stdout=out)
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag', flat=True)), ['котики']
+        )
+        self.assertTrue(
+            PostMention.objects.filter(user=self.leo, post=post).exists()
+        )
+        self.assertIn('Постов: 1, тегов: 1, упоминаний: 1', out.getvalue())
@@ -1,6 +1,9 @@
 # deals/tests/tests_models.py
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, Profile, User
 
 
 class GroupModelsTest(TestCase):
@@ -90,3 +93,56 @@ class PostModelsTest(TestCase):
         post = PostModelsTest.post
         expected_object_name = post.text
         self.assertEqual(expected_object_name, str(post))
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='counter-author')
+        self.reader = User.objects.create_user(username='counter-reader')
+
+    def test_counters_follow_creates_and_deletes(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, 1
+        )
+        comment.delete()
+        follow.delete()
+        post.delete()
+        author = Profile.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (0, 0)
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, 0
+        )
+
+    def test_rebuild_counters_fixes_drift(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Profile.objects.filter(user=self.author).update(
+            posts_count=7, followers_count=0
+        )
+        Profile.objects.filter(user=self.reader).delete()
+        Post.objects.update(comment_count=5)
+        out = StringIO()
+        call_command('rebuild_counters', batch_size=1, stdout=out)
+        self.assertIn('профилей: 2, постов: 1', out.getvalue())
+        author = Profile.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1)
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(Post.objects.get().comment_count, 1)
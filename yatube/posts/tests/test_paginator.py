@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Group, Post
+from posts.models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -129,3 +132,134 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response.context.get('page').object_list), counts
                 )
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor-user')
+        cls.group = Group.objects.create(
+            title='cursor_group',
+            slug='cursor-slug',
+            description='cursor-description')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(25)
+        )
+        Follow.objects.create(
+            user=User.objects.create_user(username='cursor-reader'),
+            author=cls.user,
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(username='cursor-reader'))
+        cache.clear()
+
+    def feed_urls(self):
+        return (
+            reverse('index'),
+            reverse('group_posts', args=[self.group.slug]),
+            reverse('profile', args=[self.user.username]),
+            reverse('follow_index'),
+        )
+
+    def test_cursor_walks_whole_feed(self):
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                seen = []
+                page = self.client.get(url).context['page']
+                seen += [post.id for post in page]
+                while page.next_cursor:
+                    page = self.client.get(
+                        url, {'cursor': page.next_cursor}
+                    ).context['page']
+                    seen += [post.id for post in page]
+                self.assertEqual(seen, expected)
+                previous = self.client.get(
+                    url, {'cursor': page.previous_cursor}
+                ).context['page']
+                self.assertEqual(
+                    [post.id for post in previous], expected[10:20]
+                )
+
+    def sql(self, params):
+        # холодный кэш: ни поколения, ни числа записей ещё нет
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index'), params)
+        return ' '.join(query['sql'] for query in queries).upper()
+
+    def test_cursor_path_runs_no_offset_or_count(self):
+        first = self.client.get(reverse('index')).context['page']
+        sql = self.sql({'cursor': first.next_cursor})
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_first_page_runs_one_bounded_count(self):
+        # номера страниц первой страницы считаются по COUNT с LIMIT,
+        # а при тёплом кэше COUNT нет совсем
+        sql = self.sql({})
+        self.assertNotIn('OFFSET', sql)
+        self.assertEqual(sql.count('COUNT('), 1)
+        self.assertRegex(sql, r'COUNT\(\*\) FROM \(SELECT .* LIMIT \d+\)')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index'))
+        self.assertNotIn(
+            'COUNT(', ' '.join(query['sql'] for query in queries).upper()
+        )
+
+    @override_settings(PAGINATION_MAX_PAGE=2)
+    def test_legacy_page_is_capped(self):
+        page = self.client.get(reverse('index'), {'page': 3}).context['page']
+        self.assertEqual(page.number, 2)
+        self.assertIsNotNone(page.next_cursor)
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('index'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 10)
+
+
+class CountCachedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='count-user')
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        counts = [
+            query for query in queries
+            if query['sql'].startswith('SELECT COUNT(')
+        ]
+        return response, len(counts)
+
+    def test_count_is_cached_until_posts_change(self):
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 1)
+        self.assertContains(response, 'Всего записей: 12')
+        self.assertEqual(self.count_queries()[1], 0)
+        Post.objects.create(text='Ещё пост', author=self.user)
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 1)
+        self.assertContains(response, 'Всего записей: 13')
+
+    @override_settings(PAGINATION_COUNT_THRESHOLD=5)
+    def test_large_counts_are_estimated(self):
+        response = self.client.get(reverse('index'))
+        paginator = response.context['paginator']
+        self.assertTrue(paginator.estimated)
+        self.assertContains(response, 'Всего записей: 5+')
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FEED_TABLES = ('posts_post', 'posts_comment', 'posts_feedentry')
+
+
+class QueryPlanTests(TestCase):
+    """Основные запросы лент не сортируют во временном B-дереве
+    и не читают таблицы целиком."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='plan-author')
+        cls.reader = User.objects.create_user(username='plan-reader')
+        cls.group = Group.objects.create(
+            title='plan', slug='plan', description='plan'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(15)
+        ]
+        cls.post = posts[0]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            if not any(table in sql for table in FEED_TABLES):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    if step.startswith('SCAN') and step != 'SCAN subquery':
+                        self.assertIn('INDEX', step)
+
+    def test_feed_queries_use_indexes(self):
+        urls = (
+            reverse('index'),
+            reverse('group_posts', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+            reverse('follow_index'),
+            reverse('post', args=[self.author.username, self.post.id]),
+        )
+        for url in urls:
+            self.assert_plans(url)
+            page = self.client.get(url).context.get('page')
+            if page is not None and page.next_cursor:
+                self.assert_plans(url, {'cursor': page.next_cursor})
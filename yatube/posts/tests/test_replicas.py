@@ -0,0 +1,110 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+from yatube import replicas
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Реплика — копия тестовой базы в файле, снятая в начале теста."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.old = Post.objects.create(
+            text='Старый пост #котики', author=self.author
+        )
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'replica.sqlite3')
+        target = sqlite3.connect(path)
+        connections['default'].connection.backup(target)
+        target.close()
+        connections.databases['replica'] = dict(
+            connections.databases['default'], NAME=path
+        )
+        # этого поста на реплике нет: она отстала
+        self.lagging = Post.objects.create(
+            text='Ещё не на реплике #котики', author=self.author
+        )
+
+    def tearDown(self):
+        connections['replica'].close()
+        delattr(connections._connections, 'replica')
+        del connections.databases['replica']
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def index(self, client):
+        return list(client.get(reverse('index')).context['page'])
+
+    def later(self):
+        """Окно после последней записи уже прошло."""
+        return mock.patch(
+            'yatube.replicas.time.time', return_value=time.time() + 60
+        )
+
+    def test_feeds_are_read_from_replica(self):
+        self.client.force_login(self.reader)
+        with self.later():
+            self.assertEqual(self.index(self.client), [self.old])
+            tag_page = self.client.get(reverse('tag_posts', args=['котики']))
+            response = self.client.get(
+                reverse('post', args=['author', self.lagging.pk])
+            )
+        self.assertEqual(list(tag_page.context['page']), [self.old])
+        self.assertEqual(response.status_code, 404)
+        # остальные страницы читают из default
+        self.assertEqual(
+            self.client.get(reverse('search'), {'q': 'реплике'})
+            .context['page'].object_list,
+            [self.lagging],
+        )
+
+    def test_recently_changed_feed_is_read_from_primary(self):
+        # читатель ничего не писал, но лента только что изменилась:
+        # страница с новым поколением не должна собираться с реплики
+        response = self.client.get(reverse('index'))
+        self.assertEqual(
+            list(response.context['page']), [self.lagging, self.old]
+        )
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+        with self.later():
+            self.assertContains(
+                self.client.get(reverse('index')), 'Ещё не на реплике'
+            )
+
+    def test_writer_reads_own_writes_from_primary(self):
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse('new_post'), {'text': 'Только что написал'}
+        )
+        self.assertIn(replicas.COOKIE, response.cookies)
+        new = Post.objects.get(text='Только что написал')
+        self.assertEqual(
+            self.index(self.client), [new, self.lagging, self.old]
+        )
+        self.assertEqual(
+            Post.objects.using('replica').filter(pk=new.pk).count(), 0
+        )
+        # без cookie и после окна свежести — снова реплика
+        self.client.cookies.pop(replicas.COOKIE)
+        with self.later():
+            self.assertEqual(self.index(self.client), [self.old])
+
+    @override_settings(REPLICA_STICKY_SECONDS=-1)
+    def test_stickiness_expires(self):
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {'text': 'Только что написал'})
+        self.assertEqual(self.index(self.client), [self.old])
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import search
+from posts.models import Comment, Post, User
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.in_text = Post.objects.create(
+            text='Котики спят на подоконнике', author=cls.user
+        )
+        cls.in_comment = Post.objects.create(
+            text='Фото с дачи', author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='Там был котик!'
+        )
+        cls.other = Post.objects.create(
+            text='Про собак', author=cls.user
+        )
+
+    def found(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        return [post.pk for post in response.context['page']]
+
+    def test_posts_and_comments_are_found_by_word_prefix(self):
+        self.assertEqual(
+            self.found('котик'), [self.in_text.pk, self.in_comment.pk]
+        )
+        self.assertEqual(self.found('СОБАК'), [self.other.pk])
+        self.assertEqual(self.found('"кот" *'), self.found('кот'))
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(pk=self.other.pk).update(text='Про котиков')
+        self.assertIn(self.other.pk, self.found('котик'))
+        self.assertEqual(self.found('собак'), [])
+        Post.objects.filter(pk=self.in_text.pk).delete()
+        self.assertNotIn(self.in_text.pk, self.found('котик'))
+
+    def test_results_are_paginated_by_cursor(self):
+        Post.objects.bulk_create(
+            Post(text=f'Котики {number}', author=self.user)
+            for number in range(22)
+        )
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(
+                reverse('search'), {'q': 'котики', 'cursor': cursor or ''}
+            )
+            page = response.context['page']
+            seen += [post.pk for post in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        # «Котики» из setUpTestData плюс 22 новых
+        self.assertEqual(len(seen), 23)
+        self.assertEqual(len(set(seen)), 23)
+        previous = page.previous_cursor
+        self.assertContains(
+            response,
+            f'?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA%D0%B8&cursor={previous}',
+        )
+
+    def test_admin_searches_through_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'secret')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'котик'}
+            )
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.in_text.pk],
+        )
+        self.assertFalse(
+            any('LIKE' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_lost_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        Post.objects.create(text='Котики без триггера', author=self.user)
+        search.ensure_index()
+        self.assertEqual(len(self.found('котики')), 2)
+        Post.objects.create(text='Котики с триггером', author=self.user)
+        self.assertEqual(len(self.found('котики')), 3)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+
+
+class SQLiteTuningTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_new_connection_is_configured(self):
+        default = connections['default']
+        wrapper = type(default)(
+            dict(
+                default.settings_dict,
+                NAME=os.path.join(self.directory, 'db.sqlite3'),
+            ),
+            alias='tuning',
+        )
+        try:
+            with wrapper.cursor() as cursor:
+                pragmas = {}
+                for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                    cursor.execute(f'PRAGMA {name}')
+                    pragmas[name] = cursor.fetchone()[0]
+        finally:
+            wrapper.close()
+        self.assertEqual(
+            pragmas,
+            {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000},
+        )
+
+    def test_concurrent_writes_are_not_locked_out(self):
+        out = StringIO()
+        call_command(
+            'bench_db', processes=4, operations=100, writes=0.5,
+            mode=['tuned'], stdout=out,
+        )
+        self.assertRegex(out.getvalue(), r'tuned: .* locked»: 0\n')
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from posts.models import Post, StoredFile, User
+from posts.storage import (ContentAddressedStorage, is_content_name,
+                           post_images)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='collector')
+
+    def references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def test_identical_content_is_stored_once(self):
+        first = post_images.save('posts/meme.JPG', ContentFile(b'meme'))
+        second = post_images.save('posts/copy.jpg', ContentFile(b'meme'))
+        other = post_images.save('posts/meme.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(is_content_name(first))
+        self.assertRegex(first, r'^posts/(..)/(..)/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertEqual(
+            [name for name in os.listdir(MEDIA_ROOT) if name != 'posts'], []
+        )
+
+    def test_file_is_deleted_with_its_last_post(self):
+        posts = [
+            Post.objects.create(
+                text='Мем',
+                author=self.user,
+                image=ContentFile(b'meme', 'a.png'),
+            )
+            for _ in range(2)
+        ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        self.assertEqual(self.references(name), 2)
+
+        posts[0].delete()
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(post_images.exists(name))
+
+        posts[1].image = ContentFile(b'new', 'b.png')
+        posts[1].save()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(post_images.exists(name))
+        self.assertEqual(self.references(posts[1].image.name), 1)
+
+    def test_reupload_survives_deleting_the_last_old_post(self):
+        old = Post.objects.create(
+            text='Мем', author=self.user, image=ContentFile(b'meme', 'a.png')
+        )
+        save = ContentAddressedStorage._save
+
+        def save_then_delete_old(storage, name, content):
+            # файл уже есть и не пишется; его последний пост удаляют
+            # раньше, чем новый пост возьмёт ссылку
+            name = save(storage, name, content)
+            old.delete()
+            return name
+
+        with mock.patch.object(
+            ContentAddressedStorage, '_save', autospec=True,
+            side_effect=save_then_delete_old,
+        ):
+            new = Post.objects.create(
+                text='Тот же мем',
+                author=self.user,
+                image=ContentFile(b'meme', 'b.png'),
+            )
+        self.assertEqual(new.image.name, old.image.name)
+        self.assertEqual(self.references(new.image.name), 1)
+        with post_images.open(new.image.name) as image:
+            self.assertEqual(image.read(), b'meme')
+
+    def test_move_post_images(self):
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        for legacy in ('posts/one.png', 'posts/two.png'):
+            with open(os.path.join(MEDIA_ROOT, legacy), 'wb') as image:
+                image.write(b'same bytes')
+        Post.objects.bulk_create([
+            Post(text='1', author=self.user, image='posts/one.png'),
+            Post(text='2', author=self.user, image='posts/one.png'),
+            Post(text='3', author=self.user, image='posts/two.png'),
+            Post(text='4', author=self.user, image='posts/lost.png'),
+        ])
+        out = StringIO()
+        call_command('move_post_images', batch_size=2, stdout=out)
+        self.assertIn(
+            'Перенесено картинок: 2, постов: 3, файлов не найдено: 1',
+            out.getvalue(),
+        )
+        names = set(
+            Post.objects.exclude(image='posts/lost.png')
+            .values_list('image', flat=True)
+        )
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_name(name))
+        self.assertEqual(self.references(name), 3)
+        self.assertFalse(post_images.exists('posts/one.png'))
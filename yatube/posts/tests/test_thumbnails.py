@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import thumbnails
+from posts.models import Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_upload(name='image.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='painter')
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=image_upload()
+        )
+
+    def test_render_builds_every_width_and_format(self):
+        manifest = thumbnails.render(self.post.image.name)
+        picture = manifest['960x339']
+        self.assertEqual((picture['width'], picture['height']), (960, 339))
+        self.assertEqual(picture['src'].count('/media/cache/'), 1)
+        widths = [
+            candidate.split()[1] for candidate in picture['srcset'].split(', ')
+        ]
+        self.assertEqual(widths, ['480w', '720w', '960w'])
+        webp, = picture['sources']
+        self.assertEqual(webp['type'], 'image/webp')
+        self.assertEqual(webp['srcset'].count('.webp'), 3)
+
+    def test_manifest_of_replaced_image_is_ignored(self):
+        thumbnails.submit(self.post.image.name, ['index'])
+        self.post.refresh_from_db()
+        self.assertIn('960x339', thumbnails.manifest(self.post))
+        self.post.image = 'posts/other.png'
+        self.assertEqual(thumbnails.manifest(self.post), {})
+
+    def test_missing_image_is_not_retried_at_once(self):
+        Post.objects.filter(pk=self.post.pk).update(image='posts/missing.png')
+        with self.assertLogs('posts.thumbnails', 'WARNING'):
+            post = Post.objects.get(pk=self.post.pk)
+            self.assertIsNone(thumbnails.picture(post, '960x339'))
+        with mock.patch.object(thumbnails, 'render') as render:
+            post = Post.objects.get(pk=self.post.pk)
+            self.assertIsNone(thumbnails.picture(post, '960x339'))
+        render.assert_not_called()
+
+    def test_prefetch_resolves_whole_page_at_once(self):
+        for number in range(5):
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user, image=image_upload()
+            )
+        posts = list(Post.objects.all())
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            with self.assertNumQueries(2):
+                thumbnails.prefetch(posts, '960x339')
+        # у всех постов одна и та же картинка
+        submit.assert_called_once()
+
+        thumbnails.submit(self.post.image.name, submit.call_args[0][1])
+        posts = list(Post.objects.all())
+        with mock.patch.object(thumbnails, 'cache') as cache_mock:
+            with self.assertNumQueries(0):
+                thumbnails.prefetch(posts, '960x339')
+        cache_mock.get_many.assert_not_called()
+        for post in posts:
+            self.assertEqual(post.pictures['960x339']['width'], 960)
+
+    def test_page_shows_placeholder_until_variants_are_ready(self):
+        url = reverse('post', args=[self.user.username, self.post.pk])
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            response = self.client.get(url)
+        submit.assert_called_once()
+        self.assertContains(response, 'card-img bg-light')
+        self.assertNotContains(response, '<picture>')
+
+        thumbnails.submit(self.post.image.name, submit.call_args[0][1])
+        response = self.client.get(url)
+        self.assertNotContains(response, 'card-img bg-light')
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'width="960" height="339"')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTest(TransactionTestCase):
+    def setUp(self):
+        # процессы пула видят настройки на момент своего запуска
+        thumbnails.shutdown()
+        self.addCleanup(thumbnails.shutdown)
+
+    def test_variants_are_built_in_process_pool(self):
+        user = User.objects.create_user(username='pool-painter')
+        post = Post.objects.create(
+            text='Пост с картинкой', author=user, image=image_upload()
+        )
+        thumbnails.submit(post.image.name, ['index'])
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            post.refresh_from_db()
+            if post.image_manifest:
+                break
+            time.sleep(0.1)
+        self.assertIn('960x339', thumbnails.manifest(post))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class RebuildThumbnailsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='archivist')
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=user,
+                image=image_upload(size=(1200 + number, 800)),
+            )
+            for number in range(3)
+        ]
+        Post.objects.create(
+            text='Копия', author=user, image=self.posts[0].image
+        )
+        self.checkpoint = os.path.join(MEDIA_ROOT, 'checkpoint.json')
+
+    def rebuild(self, workers=0):
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails',
+            workers=workers,
+            checkpoint=self.checkpoint,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_only_stale_manifests_are_rebuilt(self):
+        self.assertIn('построено: 3, актуальны: 0', self.rebuild())
+        for post in Post.objects.all():
+            self.assertTrue(
+                thumbnails.is_current(post.image.name, post.image_manifest)
+            )
+        self.assertIn('построено: 0, актуальны: 3', self.rebuild())
+
+        post = Post.objects.get(pk=self.posts[1].pk)
+        stale = json.loads(post.image_manifest)
+        stale['layout'] = 'old'
+        Post.objects.filter(pk=post.pk).update(
+            image_manifest=json.dumps(stale)
+        )
+        self.assertIn('построено: 1, актуальны: 2', self.rebuild())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_run_resumes_after_checkpoint(self):
+        names = sorted({post.image.name for post in self.posts})
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'layout': thumbnails.LAYOUT, 'after': names[0]}, file)
+        output = self.rebuild()
+        self.assertIn(f'Продолжаю после {names[0]}', output)
+        self.assertIn('2 из 2', output)
+        self.assertFalse(
+            Post.objects.filter(image=names[0]).exclude(image_manifest='')
+            .exists()
+        )
+
+    def test_variants_are_built_in_process_pool(self):
+        self.assertIn('построено: 3', self.rebuild(workers=2))
+        self.assertFalse(Post.objects.filter(image_manifest='').exists())
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_page(self, **params):
+        return self.client.get(reverse('follow_index'), params).context['page']
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        old_post = Post.objects.create(text='Старый пост', author=self.author)
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=old_post).exists()
+        )
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    @override_settings(FEED_BACKFILL_LIMIT=2)
+    def test_follow_backfills_only_recent_posts(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(5)
+        ]
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertEqual(
+            set(
+                FeedEntry.objects.filter(user=self.reader).values_list(
+                    'post', flat=True
+                )
+            ),
+            {posts[-1].id, posts[-2].id},
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        entry = FeedEntry.objects.get(user=self.reader)
+        self.assertEqual(entry.post, post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.client.force_login(self.reader)
+        self.assertIn(post, self.follow_page())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_large_author_is_pulled_at_read_time(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(
+            user=User.objects.create_user(username='second'),
+            author=self.author,
+        )
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(12)
+        ]
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertFalse(
+            Follow.objects.filter(author=self.author, fanout=True).exists()
+        )
+        first = self.follow_page()
+        second = self.follow_page(cursor=first.next_cursor)
+        seen = [post.id for post in first] + [post.id for post in second]
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_follows_an_author_who_is_already_in_pull_mode(self):
+        for username in ('first', 'second'):
+            Follow.objects.create(
+                user=User.objects.create_user(username=username),
+                author=self.author,
+            )
+        Post.objects.create(text='Первый пост', author=self.author)
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertFalse(
+            Follow.objects.get(user=self.reader, author=self.author).fanout
+        )
+        post = Post.objects.create(text='Второй пост', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.follow_page()[0], post)
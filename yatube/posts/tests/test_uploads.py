@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django import forms
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image, ImageFile
+from posts import uploads
+from posts.forms import PostForm
+from posts.models import User
+from posts.storage import post_images
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_bytes(image_format, size=(300, 200), orientation=1):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010F] = 'Камера с геометкой'
+    # XMP Pillow умеет записать только в WebP
+    extra = {'xmp': b'<x:xmpmeta/>'} if image_format == 'WEBP' else {}
+    buffer = BytesIO()
+    Image.new('RGB', size, (20, 120, 220)).save(
+        buffer, image_format, exif=exif.tobytes(), **extra
+    )
+    return buffer.getvalue()
+
+
+def peak_growth(action, path, results):
+    """Прирост пикового RSS процесса (КБ) за время action(path)."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    action(path)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put(after - before)
+
+
+def decode(path):
+    with Image.open(path) as image:
+        image.load()
+
+
+def upload(path):
+    with open(path, 'rb') as file:
+        data = UploadedFile(
+            file, 'big.jpg', 'image/jpeg', os.path.getsize(path)
+        )
+        image = forms.ImageField().clean(data)
+        post_images.save('posts/big.jpg', uploads.clean(image))
+
+
+def measure(action, path):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=peak_growth, args=(action, path, results))
+    process.start()
+    growth = results.get(timeout=60)
+    process.join()
+    return growth
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class UploadsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='photographer')
+
+    def save_post(self, name, content):
+        form = PostForm(
+            {'text': 'Фото'},
+            {'image': SimpleUploadedFile(name, content)},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        self.post = post
+        return Image.open(post_images.path(post.image.name))
+
+    def test_metadata_is_stripped_without_touching_pixels(self):
+        for image_format in ('JPEG', 'PNG', 'WEBP'):
+            with self.subTest(image_format=image_format):
+                content = image_bytes(image_format)
+                saved = self.save_post(f'photo.{image_format}', content)
+                self.assertEqual(dict(saved.getexif()), {})
+                self.assertNotIn('xmp', saved.info)
+                original = Image.open(BytesIO(content))
+                self.assertEqual(saved.tobytes(), original.tobytes())
+
+    def test_rotated_jpeg_is_turned_upright(self):
+        saved = self.save_post('photo.jpg', image_bytes('JPEG', orientation=6))
+        self.assertEqual(saved.size, (200, 300))
+        self.assertEqual(dict(saved.getexif()), {})
+
+    def test_other_formats_are_reencoded_without_metadata(self):
+        for image_format in ('TIFF', 'GIF', 'BMP'):
+            with self.subTest(image_format=image_format):
+                content = image_bytes(image_format)
+                saved = self.save_post(f'photo.{image_format}', content)
+                self.assertEqual(saved.format, image_format)
+                # у TIFF в getexif() и служебные теги самого файла
+                self.assertNotIn(0x010F, saved.getexif())
+                original = Image.open(BytesIO(content))
+                self.assertEqual(saved.tobytes(), original.tobytes())
+
+    def test_animation_is_stored_as_is(self):
+        buffer = BytesIO()
+        frames = [
+            Image.new('RGB', (30, 20), color) for color in ('red', 'blue')
+        ]
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+        saved = self.save_post('photo.gif', buffer.getvalue())
+        self.assertEqual(saved.n_frames, 2)
+        with open(saved.filename, 'rb') as file:
+            self.assertEqual(file.read(), buffer.getvalue())
+
+    @override_settings(IMAGE_MAX_PIXELS=300 * 199)
+    def test_too_many_pixels_are_rejected_before_decoding(self):
+        form = PostForm(
+            {'text': 'Бомба'},
+            {'image': SimpleUploadedFile('bomb.png', image_bytes('PNG'))},
+        )
+        with mock.patch.object(
+            ImageFile.ImageFile, 'load', side_effect=AssertionError
+        ):
+            self.assertFalse(form.is_valid())
+        self.assertIn('Мпикс', form.errors['image'][0])
+
+    def test_upload_peak_memory_does_not_depend_on_pixel_count(self):
+        path = os.path.join(MEDIA_ROOT, 'big-source.jpg')
+        with open(path, 'wb') as file:
+            file.write(image_bytes('JPEG', size=(4000, 3000)))
+        decoded = measure(decode, path)
+        streamed = measure(upload, path)
+        # 12 Мпикс в RGB — это 36 МБ
+        self.assertGreater(decoded, 30 * 1024)
+        self.assertLess(streamed, 8 * 1024)
@@ -1,7 +1,13 @@
+import warnings
+from unittest import mock
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from posts.models import Comment, Follow, Group, Post
 
@@ -323,3 +329,226 @@ class TestCommentsFollow(TestCase):
         )
 
         self.assertContains(response, 'Тестовый комментарий')
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='feed-author')
+        cls.reader = User.objects.create_user(username='feed-reader')
+        cls.group = Group.objects.create(
+            title='Лента', slug='feed', description='Лента'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=self.author, group=self.group
+            )
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'
+            )
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        urls = {
+            reverse('index'): 3,
+            reverse('group_posts', args=[self.group.slug]): 5,
+            reverse('profile', args=[self.author.username]): 6,
+            reverse('follow_index'): 5,
+        }
+        for posts in (1, 9):
+            self.create_posts(posts)
+            for url, queries in urls.items():
+                with self.subTest(url=url, posts=posts):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        response = self.client.get(url)
+                    self.assertContains(response, 'Комментариев: 1')
+
+
+class FeedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='cache-author')
+        self.reader = User.objects.create_user(username='cache-reader')
+        self.group = Group.objects.create(
+            title='Кэш', slug='cache', description='Кэш'
+        )
+        self.post = Post.objects.create(
+            text='Первая версия', author=self.author, group=self.group
+        )
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_urls(self):
+        return (
+            reverse('index'),
+            reverse('group_posts', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+        )
+
+    def test_edit_is_visible_right_away(self):
+        for url in self.feed_urls():
+            self.assertContains(self.reader_client.get(url), 'Первая версия')
+        self.author_client.post(
+            reverse('post_edit', args=[self.author.username, self.post.id]),
+            {'text': 'Вторая версия', 'group': self.group.id},
+        )
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertContains(response, 'Вторая версия')
+
+    def test_comment_is_visible_right_away(self):
+        self.assertNotContains(
+            self.reader_client.get(reverse('index')), 'Комментариев'
+        )
+        self.reader_client.post(
+            reverse('add_comment', args=[self.author.username, self.post.id]),
+            {'text': 'Комментарий'},
+        )
+        self.assertContains(
+            self.reader_client.get(reverse('index')), 'Комментариев: 1'
+        )
+
+    def test_follow_feed_is_cached_per_user(self):
+        other = User.objects.create_user(username='cache-other')
+        other_client = Client()
+        other_client.force_login(other)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(
+            self.reader_client.get(reverse('follow_index')), 'Первая версия'
+        )
+        self.assertNotContains(
+            other_client.get(reverse('follow_index')), 'Первая версия'
+        )
+
+    def test_follow_feed_reads_a_fixed_number_of_keys(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(30):
+            author = User.objects.create_user(username=f'cache-{number}')
+            Follow.objects.create(user=self.reader, author=author)
+        # автор без раскладки: его подписчики читают общее поколение
+        Follow.objects.filter(author=self.author).update(fanout=False)
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as (
+            get_many
+        ), warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertNotContains(
+                self.reader_client.get(reverse('follow_index')),
+                'Комментариев',
+            )
+        keys = {key for call in get_many.call_args_list for key in call[0][0]}
+        self.assertEqual(keys, {
+            f'generation:follow:{self.reader.id}', 'generation:follow:pull',
+        })
+        self.reader_client.post(
+            reverse('add_comment', args=[self.author.username, self.post.id]),
+            {'text': 'Комментарий'},
+        )
+        self.assertContains(
+            self.reader_client.get(reverse('follow_index')), 'Комментариев: 1'
+        )
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='etag-author')
+        self.group = Group.objects.create(
+            title='ETag', slug='etag', description='ETag'
+        )
+        self.post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.urls = (
+            reverse('index'),
+            reverse('group_posts', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+            reverse('post', args=[self.author.username, self.post.id]),
+        )
+
+    def test_unchanged_pages_answer_304_without_main_query(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(
+                    any('posts_post' in query['sql'] for query in queries)
+                )
+
+    def test_writes_change_validators(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_logged_in_and_anonymous_validators_differ(self):
+        anonymous = self.client.get(reverse('index'))
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(
+            reverse('index'), HTTP_IF_NONE_MATCH=anonymous['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+
+
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='page-author')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_repeat_anonymous_hit_skips_database(self):
+        first = self.client.get(reverse('index'))
+        self.assertNotIn('Cookie', first.get('Vary', ''))
+        self.assertIn('public', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('index'))
+        self.assertEqual(second.content, first.content)
+
+    def test_writes_purge_anonymous_pages(self):
+        urls = (
+            reverse('index'),
+            reverse('profile', args=[self.author.username]),
+            reverse('post', args=[self.author.username, self.post.id]),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.author_client.post(
+            reverse('add_comment', args=[self.author.username, self.post.id]),
+            {'text': 'Свежий комментарий'},
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Комментари')
+        self.assertContains(
+            self.client.get(urls[2]), 'Свежий комментарий'
+        )
+
+    def test_logged_in_users_bypass_page_cache(self):
+        self.client.get(reverse('index'))
+        response = self.author_client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
+        self.assertIn('Cookie', response['Vary'])
@@ -0,0 +1,302 @@
+"""Миниатюры картинок постов.
+
+{% thumbnail %} строил миниатюру прямо во время рендера, и первый
+читатель нового поста платил за декодирование, ресайз и кодирование
+картинки. Теперь после сохранения поста все варианты строятся в пуле
+процессов: для каждого размера из GEOMETRIES несколько ширин WIDTHS в
+форматах FORMATS. Их адреса складываются в манифест Post.image_manifest,
+и шаблон собирает <picture> со srcset, не обращаясь ни к хранилищу, ни
+к кэшу. Пока манифеста нет, показывается заглушка.
+"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+from .storage import touch
+
+logger = logging.getLogger(__name__)
+
+# все размеры, которые выводят шаблоны
+GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# ширины вариантов для srcset: телефон, планшет, десктоп
+WIDTHS = (480, 720, 960)
+# первый формат — запасной для <img>, остальные идут в <source>
+FORMATS = ('JPEG', 'WEBP')
+
+# меняется вместе с набором вариантов: манифесты со старым LAYOUT
+# перестраивает команда rebuild_thumbnails
+LAYOUT = hashlib.md5(
+    json.dumps([GEOMETRIES, WIDTHS, FORMATS]).encode()
+).hexdigest()[:12]
+
+# через сколько секунд снова пробовать картинку, которую не удалось открыть
+RETRY_TIMEOUT = 300
+
+_pool = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def thumbnail_file(name, geometry, options):
+    """Файл миниатюры с тем же именем, что выбрал бы sorl.
+
+    Имя считается без обращения к хранилищу, а уже построенные раньше
+    {% thumbnail %} миниатюры подхватываются без пересчёта.
+    """
+    source = ImageFile(name)
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return source, ImageFile(name, default.storage), options
+
+
+def variant_geometries(geometry):
+    """Уменьшенные копии geometry с теми же пропорциями."""
+    width, height = (int(side) for side in geometry.split('x'))
+    for variant in WIDTHS:
+        if variant < width:
+            yield f'{variant}x{round(height * variant / width)}'
+    yield geometry
+
+
+def broken_key(name):
+    return f'thumbnail-broken:{name}'
+
+
+class Source:
+    """Исходная картинка, которую декодируют только при первой нужде."""
+
+    def __init__(self, name):
+        self.name = name
+        self.image = None
+
+    def build(self, geometry, options):
+        source, thumbnail, options = thumbnail_file(
+            self.name, geometry, options
+        )
+        if not thumbnail.exists():
+            if self.image is None:
+                self.image = default.engine.get_image(source)
+            options['image_info'] = default.engine.get_image_info(self.image)
+            default.backend._create_thumbnail(
+                self.image, geometry, options, thumbnail
+            )
+        else:
+            touch(default.storage, thumbnail.name)
+        thumbnail.set_size()
+        return thumbnail
+
+    def close(self):
+        if self.image is not None:
+            default.engine.cleanup(self.image)
+
+
+def render(name):
+    """Построить все варианты картинки name и вернуть её манифест.
+
+    Выполняется в процессе пула, поэтому не трогает ни базу, ни кэш.
+    Для картинки, которую не удалось открыть, возвращает None.
+    """
+    manifest = {'source': name, 'layout': LAYOUT}
+    source = Source(name)
+    try:
+        for geometry, options in GEOMETRIES:
+            picture = manifest[geometry] = {'sources': []}
+            for image_format in FORMATS:
+                variant_options = dict(options)
+                if image_format != sorl_settings.THUMBNAIL_FORMAT:
+                    variant_options['format'] = image_format
+                candidates = []
+                for variant in variant_geometries(geometry):
+                    thumbnail = source.build(variant, variant_options)
+                    candidates.append(f'{thumbnail.url} {thumbnail.width}w')
+                srcset = ', '.join(candidates)
+                if image_format == FORMATS[0]:
+                    picture.update(
+                        src=thumbnail.url,
+                        srcset=srcset,
+                        width=thumbnail.width,
+                        height=thumbnail.height,
+                    )
+                else:
+                    picture['sources'].append({
+                        'type': f'image/{image_format.lower()}',
+                        'srcset': srcset,
+                    })
+    except OSError:
+        logger.warning('Не удалось открыть картинку %s', name)
+        return None
+    finally:
+        source.close()
+    return manifest
+
+
+def remember(name, manifest, scopes):
+    if manifest is None:
+        cache.set(broken_key(name), True, RETRY_TIMEOUT)
+        return
+    Post.objects.filter(image=name).update(
+        image_manifest=json.dumps(manifest)
+    )
+    # в закэшированных фрагментах лент на месте картинки заглушка
+    caching.bump(*scopes)
+
+
+def get_pool(broken=False):
+    global _pool
+    if _pool is None or broken:
+        _pool = ProcessPoolExecutor(settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown(wait=True):
+    """Остановить пул; следующая картинка создаст новый."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait)
+        _pool = None
+
+
+def _done(name, scopes, caller, future):
+    with _lock:
+        _pending.discard(name)
+    try:
+        remember(name, future.result(), scopes)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', name)
+    finally:
+        # обычно колбэк выполняется в служебном потоке пула, и его
+        # соединение с базой больше никому не нужно
+        if threading.get_ident() != caller:
+            connection.close()
+
+
+def submit(name, scopes):
+    """Поставить картинку в очередь пула.
+
+    Картинка, которая уже строится в этом процессе, повторно не
+    ставится. При THUMBNAIL_WORKERS = 0 варианты строятся сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        try:
+            remember(name, render(name), scopes)
+        except Exception:
+            logger.exception('Не удалось построить миниатюры %s', name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        try:
+            future = get_pool().submit(render, name)
+        except BrokenProcessPool:
+            # воркер упал (например, по памяти): пул нужно пересоздать
+            future = get_pool(broken=True).submit(render, name)
+    future.add_done_callback(
+        partial(_done, name, scopes, threading.get_ident())
+    )
+
+
+def schedule(post):
+    """Построить варианты картинки поста после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(
+            lambda: submit(post.image.name, caching.post_scopes(post))
+        )
+
+
+def manifest(post):
+    """Манифест текущей картинки поста или пустой словарь."""
+    if not post.image or not post.image_manifest:
+        return {}
+    value = json.loads(post.image_manifest)
+    return value if value.get('source') == post.image.name else {}
+
+
+def is_current(name, value):
+    """Построен ли манифест value для картинки name и текущих вариантов."""
+    if not value:
+        return False
+    value = json.loads(value)
+    return value.get('source') == name and value.get('layout') == LAYOUT
+
+
+def manifest_files(value):
+    """Имена файлов миниатюр, на которые ссылается манифест value."""
+    prefix = default.storage.base_url
+    for picture in json.loads(value).values():
+        if not isinstance(picture, dict):
+            continue
+        srcsets = [picture.get('srcset', '')]
+        srcsets += [source['srcset'] for source in picture.get('sources', ())]
+        for srcset in srcsets:
+            for candidate in srcset.split(', '):
+                url = candidate.split(' ')[0]
+                if url.startswith(prefix):
+                    yield unquote(url[len(prefix):])
+
+
+def picture(post, geometry):
+    """Варианты картинки поста для geometry или None, пока их строят.
+
+    Если манифеста нет (старый пост или картинку только что сменили),
+    картинка ставится в очередь. После prefetch ответ готов заранее.
+    """
+    prefetched = getattr(post, 'pictures', {})
+    if geometry in prefetched:
+        return prefetched[geometry]
+    prefetch([post], geometry)
+    return post.pictures[geometry]
+
+
+def prefetch(posts, geometry):
+    """Разобрать манифесты всех постов страницы за один проход.
+
+    Результат кладётся в post.pictures, и шаблон поста больше ничего не
+    читает. Для постов без манифеста метки битых картинок читаются одним
+    get_many, а поколения их лент считаются одним запросом.
+    """
+    missing = []
+    for post in posts:
+        if not hasattr(post, 'pictures'):
+            post.pictures = {}
+        value = manifest(post).get(geometry) if post.image else None
+        post.pictures[geometry] = value
+        if post.image and value is None:
+            missing.append(post)
+    if not missing:
+        return
+    broken = cache.get_many([broken_key(post.image.name) for post in missing])
+    queued = [
+        post for post in missing
+        if broken_key(post.image.name) not in broken
+    ]
+    if queued:
+        scopes = caching.post_scopes(*queued)
+        for name in {post.image.name for post in queued}:
+            submit(name, scopes)
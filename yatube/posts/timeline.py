@@ -0,0 +1,123 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается в FeedEntry каждого подписчика, поэтому
+follow_index читает ленту одним диапазоном по индексу (user, pub_date).
+У авторов, чьих подписчиков больше FEED_FANOUT_LIMIT, посты не
+раскладываются: их подписки переводятся в режим fanout=False, и такие
+посты подмешиваются в ленту при чтении. Обратно в режим раскладки
+автор не переводится. При подписке в ленту раскладываются только
+FEED_BACKFILL_LIMIT последних постов автора, чтобы подписка на
+плодовитого автора не писала неограниченное число строк.
+"""
+from itertools import islice
+
+from django.conf import settings
+
+from .models import FeedEntry, Follow, Post, Profile
+from .paginator import CursorPaginator, keyset_slice
+
+
+def _insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pull_author(author_id):
+    follows = Follow.objects.filter(author_id=author_id)
+    if follows.filter(fanout=False).exists():
+        return True
+    if Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists():
+        follows.update(fanout=False)
+        return True
+    return False
+
+
+def fan_out(post):
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, fanout=True
+    ).values_list('user_id', flat=True)
+    _insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def subscribe(follow):
+    if is_pull_author(follow.author_id):
+        # новая подписка на автора без раскладки тоже читается при чтении
+        Follow.objects.filter(pk=follow.pk).update(fanout=False)
+        follow.fanout = False
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    _insert(
+        FeedEntry(
+            user_id=follow.user_id,
+            post_id=post_id,
+            author_id=follow.author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def unsubscribe(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: FeedEntry плюс посты авторов без раскладки.
+
+    Старый ?page=N по-прежнему считается по соединению Follow и Post.
+    """
+
+    def __init__(self, user, per_page, **kwargs):
+        self.user = user
+        super().__init__(
+            Post.objects.for_feed().filter(author__following__user=user),
+            per_page,
+            **kwargs,
+        )
+
+    def fetch(self, values, reverse, limit):
+        entries = FeedEntry.objects.filter(user=self.user).select_related(
+            'post', 'post__author', 'post__group'
+        )
+        posts = {
+            entry.post_id: entry.post
+            for entry in keyset_slice(
+                entries, ('-pub_date', '-post_id'), values, reverse, limit
+            )
+        }
+        pull_authors = list(
+            Follow.objects.filter(user=self.user, fanout=False).values_list(
+                'author_id', flat=True
+            )
+        )
+        if pull_authors:
+            pulled = keyset_slice(
+                Post.objects.for_feed().filter(author_id__in=pull_authors),
+                self.ordering,
+                values, reverse, limit,
+            )
+            for post in pulled:
+                posts.setdefault(post.id, post)
+        objects = sorted(posts.values(), key=self.position, reverse=True)
+        return objects[-limit:] if reverse else objects[:limit]
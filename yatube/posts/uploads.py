@@ -0,0 +1,273 @@
+"""Проверка и очистка загруженных картинок без полного декодирования.
+
+ImageField формы уже открыл картинку и прочитал только заголовок: по
+нему проверяются размеры и число пикселей, так что «бомба» на сотни
+мегапикселей отклоняется раньше, чем кто-то попробует её распаковать.
+Дальше файл уходит в хранилище кусками, а по пути из JPEG, PNG и WebP
+выбрасываются метаданные (EXIF с геометкой, XMP, IPTC, комментарии).
+Декодировать приходится JPEG с поворотом в EXIF (без метаданных его
+нужно повернуть по-настоящему) и картинки остальных форматов, которые
+пересохраняются без метаданных; память тогда ограничена
+IMAGE_MAX_PIXELS. Анимации и многостраничные файлы уходят как есть:
+пересохранение всех кадров в эту границу не укладывается.
+"""
+import functools
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+ORIENTATION = 0x0112
+
+# JFIF, ICC-профиль и Adobe (нужен для цветов CMYK) оставляем,
+# остальные APPn и комментарии выбрасываем
+JPEG_KEEP = {0xE0, 0xE2, 0xEE}
+JPEG_COMMENT = 0xFE
+JPEG_START_OF_SCAN = 0xDA
+JPEG_END = 0xD9
+# маркеры без длины: RST0–RST7 и TEM
+JPEG_STANDALONE = {*range(0xD0, 0xD8), 0x01}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_DROP = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+WEBP_DROP = {b'EXIF', b'XMP '}
+# флаги EXIF и XMP в заголовке VP8X
+WEBP_METADATA_FLAGS = 0x08 | 0x04
+
+
+class Reader:
+    """Чтение ровно n байт из потока кусков без склейки всего файла."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        if len(data) < size:
+            raise ValueError('Файл обрезан')
+        return data
+
+    def copy(self, size):
+        """Отдать следующие size байт по кускам, не накапливая их."""
+        while size:
+            if not self.buffer:
+                self.buffer = next(self.chunks, b'')
+                if not self.buffer:
+                    raise ValueError('Файл обрезан')
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            size -= len(data)
+            yield data
+
+    def rest(self):
+        if self.buffer:
+            yield self.buffer
+            self.buffer = b''
+        yield from self.chunks
+
+
+def strip_jpeg(chunks):
+    reader = Reader(chunks)
+    if reader.read(2) != b'\xff\xd8':
+        raise ValueError('Это не JPEG')
+    yield b'\xff\xd8'
+    while True:
+        marker = reader.read(2)
+        if marker[0] != 0xFF:
+            raise ValueError('Повреждённый JPEG')
+        while marker[1] == 0xFF:
+            # перед маркером бывают байты-заполнители 0xFF
+            marker = b'\xff' + reader.read(1)
+        code = marker[1]
+        if code in (JPEG_START_OF_SCAN, JPEG_END):
+            # дальше сжатые данные: метаданных там нет
+            yield marker
+            yield from reader.rest()
+            return
+        if code in JPEG_STANDALONE:
+            yield marker
+            continue
+        length = reader.read(2)
+        size = int.from_bytes(length, 'big') - 2
+        if code == JPEG_COMMENT or (0xE0 <= code <= 0xEF
+                                    and code not in JPEG_KEEP):
+            for _ in reader.copy(size):
+                pass
+            continue
+        yield marker + length
+        yield from reader.copy(size)
+
+
+def strip_png(chunks):
+    reader = Reader(chunks)
+    if reader.read(8) != PNG_SIGNATURE:
+        raise ValueError('Это не PNG')
+    yield PNG_SIGNATURE
+    while True:
+        header = reader.read(8)
+        size = int.from_bytes(header[:4], 'big')
+        kind = header[4:]
+        # данные и CRC идут потоком: IDAT бывает любого размера
+        body = reader.copy(size + 4)
+        if kind in PNG_DROP:
+            for _ in body:
+                pass
+        else:
+            yield header
+            yield from body
+        if kind == b'IEND':
+            return
+
+
+def webp_chunk_size(header):
+    # данные чанка RIFF выравниваются до чётной длины
+    size = int.from_bytes(header[4:], 'little')
+    return size + size % 2
+
+
+def webp_metadata_size(file):
+    """Сколько байт занимают чанки EXIF и XMP вместе с заголовками.
+
+    Размер RIFF стоит в начале файла, поэтому его нужно знать до того,
+    как чанки пойдут потоком; заголовки читаются с перемоткой.
+    """
+    file.seek(4)
+    end = 8 + int.from_bytes(file.read(4), 'little')
+    file.seek(12)
+    size = 0
+    while file.tell() < end:
+        header = file.read(8)
+        if len(header) < 8:
+            break
+        skip = webp_chunk_size(header)
+        if header[:4] in WEBP_DROP:
+            size += 8 + skip
+        file.seek(skip, 1)
+    return size
+
+
+def strip_webp(chunks, dropped):
+    reader = Reader(chunks)
+    header = reader.read(12)
+    if header[:4] != b'RIFF' or header[8:] != b'WEBP':
+        raise ValueError('Это не WebP')
+    size = int.from_bytes(header[4:8], 'little') - dropped
+    yield b'RIFF' + size.to_bytes(4, 'little') + b'WEBP'
+    size -= 4
+    while size > 0:
+        chunk = reader.read(8)
+        skip = webp_chunk_size(chunk)
+        size -= 8 + skip
+        if chunk[:4] in WEBP_DROP:
+            for _ in reader.copy(skip):
+                pass
+            continue
+        yield chunk
+        if chunk[:4] == b'VP8X':
+            flags = reader.read(1)[0] & ~WEBP_METADATA_FLAGS
+            yield bytes([flags])
+            skip -= 1
+        yield from reader.copy(skip)
+
+
+STRIPPERS = {
+    'JPEG': strip_jpeg,
+    'PNG': strip_png,
+    'WEBP': strip_webp,
+}
+
+
+class CleanedUpload(File):
+    """Загрузка, которая отдаёт хранилищу содержимое без метаданных."""
+
+    def __init__(self, upload, strip):
+        super().__init__(upload.file, upload.name)
+        self.upload = upload
+        self.strip = strip
+
+    def chunks(self, chunk_size=None):
+        return self.strip(self.upload.chunks(chunk_size))
+
+    def multiple_chunks(self, chunk_size=None):
+        return True
+
+
+def check_size(width, height):
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(pixels).0f Мпикс, можно не '
+            'больше %(limit).0f Мпикс',
+            code='too_many_pixels',
+            params={
+                'pixels': width * height / 10 ** 6,
+                'limit': settings.IMAGE_MAX_PIXELS / 10 ** 6,
+            },
+        )
+    if max(width, height) > settings.IMAGE_MAX_SIDE:
+        raise ValidationError(
+            'Сторона картинки не может быть больше %(limit)d пикселей',
+            code='too_long',
+            params={'limit': settings.IMAGE_MAX_SIDE},
+        )
+
+
+def reencoded(upload, image_format):
+    """Пересохранить картинку без метаданных, повернув её по EXIF.
+
+    Форматы, которые Pillow не умеет записывать, сохраняются в PNG.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        options = {
+            key: image.info[key]
+            for key in ('icc_profile', 'transparency')
+            if image.info.get(key) is not None
+        }
+        # копия — уже не файл формата и не тащит за собой его теги
+        rotated = ImageOps.exif_transpose(image)
+    name = upload.name
+    if image_format not in Image.SAVE:
+        image_format = 'PNG'
+        name = os.path.splitext(name)[0] + '.png'
+    if image_format == 'JPEG':
+        options.update(quality=90, optimize=True)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    rotated.save(output, image_format, **options)
+    rotated.close()
+    output.seek(0)
+    return File(output, name)
+
+
+def clean(upload):
+    """Проверить загрузку по заголовку и подготовить её к сохранению.
+
+    upload — файл из cleaned_data формы: ImageField кладёт в
+    upload.image картинку, у которой прочитан только заголовок.
+    """
+    image = upload.image
+    check_size(*image.size)
+    if image.format == 'JPEG':
+        orientation = image.getexif().get(ORIENTATION, 1)
+        if orientation != 1:
+            return reencoded(upload, 'JPEG')
+    strip = STRIPPERS.get(image.format)
+    if strip is None:
+        if getattr(image, 'is_animated', False):
+            return upload
+        return reencoded(upload, image.format)
+    if image.format == 'WEBP':
+        strip = functools.partial(
+            strip_webp, dropped=webp_metadata_size(upload)
+        )
+    return CleanedUpload(upload, strip)
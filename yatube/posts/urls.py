@@ -5,8 +5,22 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
+    path('upload/', views.upload_start, name='upload_start'),
+    path(
+        'upload/<uuid:upload_id>/',
+        views.upload_chunk,
+        name='upload_status'
+    ),
+    path(
+        'upload/<uuid:upload_id>/<int:index>/',
+        views.upload_chunk,
+        name='upload_chunk'
+    ),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
+    path('tag/<str:tag>/', views.tag_posts, name='tag_posts'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/', views.suggest, name='autocomplete'),
     path(
         '<str:username>/follow/',
         views.profile_follow,
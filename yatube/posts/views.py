@@ -1,55 +1,268 @@
+import uuid
+from contextlib import contextmanager, nullcontext
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+from yatube.replicas import read_replica
 
+from . import autocomplete, chunked, hashtags, thumbnails
+from .caching import changed_at, conditional, follow_scopes, generation
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import ChunkedUpload, Follow, Group, Post, get_profile
+from .paginator import CursorPaginator
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
 
+def author_pk(username):
+    return User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def tag_scopes(request, tag):
+    # лента тега меняется с любым постом, поэтому и поколение — 'index'
+    return ['index']
+
+
+def timeline_scopes(request):
+    # поколения нужны и для реплики, и для ленты: считаем их раз
+    if not hasattr(request, '_follow_scopes'):
+        request._follow_scopes = follow_scopes(request.user.id)
+    return request._follow_scopes
+
+
+def group_scopes(request, slug):
+    group_pk = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return group_pk and [f'group:{group_pk}']
+
+
+def profile_scopes(request, username):
+    pk = author_pk(username)
+    return pk and [f'author:{pk}']
+
+
+def post_scopes(request, username, post_id):
+    pk = author_pk(username)
+    return pk and [f'author:{pk}', f'post:{post_id}']
+
+
+@read_replica(changed_at(index_scopes))
+@conditional(index_scopes)
 def index(request):
-    post_list = Post.objects.select_related('group').all()
-    paginator = Paginator(post_list, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page, 'paginator': paginator}
+    post_list = Post.objects.for_feed()
+    paginator = CursorPaginator(
+        post_list, settings.PAGES, count_scopes=['index']
+    )
+    page = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'generation': generation('index'),
+    }
     return render(request, 'index.html', context)
 
 
+@read_replica(changed_at(group_scopes))
+@conditional(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'group': group, 'page': page, 'paginator': paginator}
+    posts = group.posts.for_feed()
+    paginator = CursorPaginator(
+        posts, settings.PAGES, count_scopes=[f'group:{group.id}']
+    )
+    page = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
+    context = {
+        'group': group,
+        'page': page,
+        'paginator': paginator,
+        'generation': generation(f'group:{group.id}'),
+    }
     return render(request, 'group.html', context)
 
 
+@read_replica(changed_at(tag_scopes))
+@conditional(tag_scopes)
+def tag_posts(request, tag):
+    tag = hashtags.normalize(tag)
+    # поколение тега нигде не меняется и только отделяет его счётчик
+    # от счётчика index
+    paginator = hashtags.TagPaginator(
+        tag, settings.PAGES, count_scopes=['index', f'tag:{tag}']
+    )
+    page = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
+    context = {
+        'tag': tag,
+        'page': page,
+        'paginator': paginator,
+        'generation': generation('index'),
+    }
+    return render(request, 'tag.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(Post.objects.for_feed(), settings.PAGES, query)
+    page = paginator.get_page(cursor=request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page': page,
+        'paginator': paginator,
+    }
+    return render(request, 'search.html', context)
+
+
+def suggest(request):
+    """Подсказки авторов и групп для строки поиска."""
+    try:
+        limit = min(
+            int(request.GET.get('limit', settings.AUTOCOMPLETE_LIMIT)),
+            settings.AUTOCOMPLETE_LIMIT,
+        )
+    except ValueError:
+        limit = settings.AUTOCOMPLETE_LIMIT
+    results = []
+    found = autocomplete.lookup(request.GET.get('q', ''), limit)
+    for kind, value in found:
+        if kind == autocomplete.USER:
+            results.append({
+                'type': kind,
+                'label': value,
+                'url': reverse('profile', args=[value]),
+            })
+        else:
+            title, slug = value
+            results.append({
+                'type': kind,
+                'label': title,
+                'url': reverse('group_posts', args=[slug]),
+            })
+    return JsonResponse({'results': results})
+
+
+@contextmanager
+def post_form(request, instance=None):
+    """PostForm, где картинку может заменить докачанная загрузка.
+
+    Загрузку форма получает по upload_id из POST: своего поля у неё нет.
+    Отдаёт форму и загрузку (или None) на время блока, после которого
+    собранный файл закрывается.
+    """
+    files = request.FILES or None
+    upload = None
+    upload_id = request.POST.get('upload_id')
+    if upload_id:
+        try:
+            upload_id = uuid.UUID(upload_id)
+        except ValueError:
+            raise Http404
+        upload = get_object_or_404(
+            ChunkedUpload, pk=upload_id, user=request.user
+        )
+        files = request.FILES.copy()
+    with (chunked.assembled(upload) if upload else nullcontext()) as image:
+        if image is not None:
+            files['image'] = image
+        form = PostForm(request.POST or None, files=files, instance=instance)
+        if upload is not None and image is None:
+            form.add_error('image', 'Картинка загружена ещё не целиком')
+        yield form, upload
+
+
 @login_required
 def new_post(request):
-    form = PostForm(
-        request.POST or None,
-        files=request.FILES or None,
-    )
-    if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        form.save()
-        return redirect('index')
+    with post_form(request) as (form, upload):
+        if form.is_valid():
+            post = form.save(commit=False)
+            post.author = request.user
+            form.save()
+            if upload is not None:
+                chunked.finish(upload)
+            thumbnails.schedule(post)
+            return redirect('index')
     return render(request, 'new.html', {'form': form})
 
 
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        upload = chunked.start(
+            request.user,
+            request.POST.get('filename', ''),
+            int(request.POST.get('size', 0)),
+        )
+    except (ValueError, chunked.InvalidChunk) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(
+        {
+            'id': str(upload.pk),
+            'chunk_size': upload.chunk_size,
+            'chunks': upload.chunks,
+        },
+        status=201,
+    )
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_chunk(request, upload_id, index=None):
+    """PUT кладёт часть index, GET показывает, каких частей не хватает."""
+    upload = get_object_or_404(
+        ChunkedUpload, pk=upload_id, user=request.user
+    )
+    if request.method == 'PUT':
+        if index is None:
+            return HttpResponseNotAllowed(['GET'])
+        try:
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            return JsonResponse(
+                {'error': 'Нужен заголовок Content-Length'}, status=400
+            )
+        try:
+            chunked.write_chunk(upload, index, request, length)
+        except chunked.InvalidChunk as error:
+            return JsonResponse({'error': str(error)}, status=400)
+    missing = upload.missing()
+    return JsonResponse({'missing': missing, 'complete': not missing})
+
+
+@read_replica(changed_at(profile_scopes))
+@conditional(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author__username=username)
-    paginator = Paginator(posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    posts_count = Post.objects.filter(author=author).count()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    posts_count = get_profile(author).posts_count
+    posts = author.posts.for_feed()
+    paginator = CursorPaginator(posts, settings.PAGES, count=posts_count)
+    page = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
     following = Follow.objects.filter(author=author)
     context = {
         'author': author,
@@ -57,6 +270,7 @@ def profile(request, username):
         'paginator': paginator,
         'posts_count': posts_count,
         'following': following,
+        'generation': generation(f'author:{author.id}'),
     }
     return render(
         request,
@@ -65,21 +279,27 @@ def profile(request, username):
     )
 
 
+@read_replica(changed_at(post_scopes))
+@conditional(post_scopes)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__profile'),
+        author__username=username,
+        id=post_id,
+    )
+    comments = post.comments.select_related('author')
     following = Follow.objects.filter(author=post.author.id,
                                       user=request.user.id)
-    followers = post.author.following.count()
-    follow = post.author.follower.count()
+    profile = get_profile(post.author)
     form = CommentForm(request.POST or None)
     context = {'post': post,
                'author': post.author,
                'form': form,
                'comments': comments,
                'following': following,
-               'followers': followers,
-               'follow': follow
+               'posts_count': profile.posts_count,
+               'followers': profile.followers_count,
+               'follow': profile.following_count
                }
     return render(request, 'post.html', context)
 
@@ -87,18 +307,17 @@ def post_view(request, username, post_id):
 @login_required
 def post_edit(request, username, post_id):
     post_edit = get_object_or_404(Post, pk=post_id, author__username=username)
-    form = PostForm(
-        request.POST or None,
-        files=request.FILES or None,
-        instance=post_edit
-    )
-
     if request.user != post_edit.author:
         return redirect('post', username, post_id)
 
-    if form.is_valid():
-        form.save()
-        return redirect('post', username, post_id)
+    with post_form(request, instance=post_edit) as (form, upload):
+        if form.is_valid():
+            post = form.save()
+            if upload is not None:
+                chunked.finish(upload)
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
+            return redirect('post', username, post_id)
 
     return render(request, 'new.html', {'form': form, 'edit': post_edit})
 
@@ -130,12 +349,21 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@read_replica(changed_at(timeline_scopes))
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page, 'paginator': paginator}
+    scopes = timeline_scopes(request)
+    paginator = TimelinePaginator(
+        request.user, settings.PAGES, count_scopes=scopes
+    )
+    page = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'generation': generation(*scopes),
+    }
     return render(request, 'follow.html', context)
 
 
@@ -0,0 +1,172 @@
+"""Отдача файлов из MEDIA_ROOT.
+
+Раньше медиафайлы отдавал django.conf.urls.static, и только при
+DEBUG. Теперь адрес MEDIA_URL обслуживает serve всегда, но сами байты
+по возможности отдаёт фронтовой сервер: при MEDIA_SENDFILE =
+'x-accel-redirect' (nginx) или 'x-sendfile' (Apache, lighttpd) ответ
+содержит только заголовок с путём к файлу. Без фронта файл уходит
+через FileResponse: сервер с wsgi.file_wrapper отправит его через
+os.sendfile, не читая в Python. Поддерживаются Range (один диапазон),
+ETag, If-Range и условные запросы.
+
+Файлы с именем по содержимому (posts.storage) никогда не меняются,
+поэтому кэшируются навсегда с immutable; остальные перепроверяются по
+ETag при каждом показе.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from posts.storage import is_content_name
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class FileRange:
+    """Кусок [start, start + length) открытого файла.
+
+    fileno() оставлен, чтобы сервер с wsgi.file_wrapper отправил кусок
+    через os.sendfile: сколько байт слать, он берёт из Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Диапазон (start, end) включительно из заголовка Range.
+
+    None — заголовка нет или он не поддерживается (несколько диапазонов),
+    тогда отдаётся весь файл. ValueError — диапазон вне файла.
+    """
+    match = RANGE.fullmatch(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # bytes=-N: последние N байт
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def etag_for(name, stat):
+    if is_content_name(name):
+        # имя и есть SHA-256 содержимого
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def if_range_passes(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def content_type(path):
+    value, _ = mimetypes.guess_type(path)
+    return value or 'application/octet-stream'
+
+
+def sendfile_response(path, name):
+    response = HttpResponse(content_type=content_type(path))
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+        )
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def file_response(request, path, stat, etag, last_modified):
+    size = stat.st_size
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE', ''), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range and not if_range_passes(request, etag, last_modified):
+        byte_range = None
+    start, end = byte_range or (0, size - 1)
+    response = FileResponse(
+        FileRange(open(path, 'rb'), start, end - start + 1),
+        content_type=content_type(path),
+        status=206 if byte_range else 200,
+    )
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    etag = etag_for(name, stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            # Range фронт разберёт сам
+            response = sendfile_response(full_path, name)
+        else:
+            response = file_response(
+                request, full_path, stat, etag, last_modified
+            )
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = (
+            IMMUTABLE if is_content_name(name) else REVALIDATE
+        )
+    return response
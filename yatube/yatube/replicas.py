@@ -0,0 +1,111 @@
+"""Чтение лент с реплик и запись в основную базу.
+
+View, обёрнутые в read_replica, читают из одной из баз
+DATABASE_REPLICAS, выбранной на весь запрос; все записи и остальные
+чтения идут в default. Реплика отстаёт от основной базы, поэтому
+пользователь, который только что что-то записал, следующие
+REPLICA_STICKY_SECONDS секунд читает с основной базы: время хранится в
+cookie, так что привязка работает во всех процессах и у анонимов. Так же
+долго после любого изменения ленты её читают из default все остальные.
+
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': '/var/lib/yatube/replica.sqlite3',
+    }
+    DATABASE_REPLICAS = ['replica']
+"""
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE = 'read_primary_until'
+
+_state = threading.local()
+
+
+def replica_alias():
+    """Реплика текущего запроса или None, если читать с основной базы."""
+    if getattr(_state, 'wrote', False) or getattr(_state, 'pinned', False):
+        return None
+    return getattr(_state, 'replica', None)
+
+
+def read_replica(get_changed_at):
+    """Разрешить view читать с реплики, если страница давно не менялась.
+
+    get_changed_at(request, *args, **kwargs) возвращает время последнего
+    изменения данных страницы (timestamp) или None. Пока с него не прошло
+    REPLICA_STICKY_SECONDS, страницу читают из default: иначе отставшая
+    реплика отрисовала бы её без новой записи, и такой ответ лёг бы в кэш
+    под уже новым поколением.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            previous = getattr(_state, 'replica', None)
+            if settings.DATABASE_REPLICAS:
+                changed_at = get_changed_at(request, *args, **kwargs)
+                if (changed_at is None or time.time() - changed_at
+                        >= settings.REPLICA_STICKY_SECONDS):
+                    _state.replica = random.choice(
+                        settings.DATABASE_REPLICAS
+                    )
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _state.replica = previous
+        return wrapper
+    return decorator
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # сессия только что создана при входе и на реплике её может не быть
+        if model._meta.app_label == 'sessions':
+            return DEFAULT_DB_ALIAS
+        return replica_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # после записи запрос дочитывает уже с основной базы
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты из них можно смешивать
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Привязать пользователя к основной базе после его записей."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            until = float(request.COOKIES.get(COOKIE, 0))
+        except ValueError:
+            until = 0
+        _state.pinned = until > time.time()
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            if _state.wrote and settings.DATABASE_REPLICAS:
+                response.set_cookie(
+                    COOKIE,
+                    str(int(time.time()) + settings.REPLICA_STICKY_SECONDS),
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            _state.pinned = False
+            _state.wrote = False
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,9 +89,28 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение живёт между запросами потока, PRAGMA не повторяются
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# псевдонимы реплик из DATABASES, с которых читают ленты
+# (yatube/replicas.py); пустой список — всё читается из default
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+# столько секунд после своей записи пользователь читает из default
+REPLICA_STICKY_SECONDS = 15
+
+# выполняются на каждом новом соединении SQLite (yatube/sqlite.py)
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение — в КиБ: 64 МБ страничного кэша
+    'cache_size': -64 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -141,6 +162,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# кто отдаёт байты медиафайлов: '' — сам Django, 'x-accel-redirect'
+# (nginx отдаёт из internal-location MEDIA_ACCEL_REDIRECT_PREFIX,
+# смотрящего в MEDIA_ROOT) или 'x-sendfile' (Apache, lighttpd)
+MEDIA_SENDFILE = ''
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
 
 
 # Login
@@ -156,10 +182,54 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # константа страниц пагинации
 PAGES = 10
-
-
+# глубже этой страницы старый ?page=N не листается, дальше только ?cursor=
+PAGINATION_MAX_PAGE = 10
+# число записей для паджинатора кэшируется и считается не дальше порога
+PAGINATION_COUNT_THRESHOLD = 10000
+PAGINATION_COUNT_TIMEOUT = 60 * 60
+# лента подписок: у авторов с большим числом подписчиков посты
+# подмешиваются при чтении, а не раскладываются каждому подписчику
+FEED_FANOUT_LIMIT = 1000
+FEED_BATCH_SIZE = 500
+# при подписке в ленту попадает не больше стольких последних постов автора
+FEED_BACKFILL_LIMIT = 200
+
+# загрузки картинок: больше стольких пикселей не принимаем, не декодируя
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MAX_SIDE = 12000
+
+# докачиваемые загрузки: части лежат здесь, пока пост не сохранён
+CHUNKED_UPLOAD_ROOT = os.path.join(BASE_DIR, 'chunked_uploads')
+CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+
+# миниатюры строятся после загрузки в пуле из стольких процессов;
+# 0 — строить сразу в процессе запроса
+THUMBNAIL_WORKERS = 2
+
+
+# подсказки авторов и групп: сколько выдавать и как часто (в секундах)
+# проверять, не поменялись ли они в других процессах
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_CHECK_INTERVAL = 5
+# сколько хранится запись журнала изменений подсказок; процесс, который
+# не заглядывал в журнал дольше, перестраивает индекс из базы
+AUTOCOMPLETE_LOG_TIMEOUT = 24 * 60 * 60
+
+# общий для всех воркеров кэш: файл SQLite в режиме WAL; тесты
+# получают свой файл на каждый запуск (yatube/testing.py)
+TEST_RUNNER = 'yatube.testing.TestRunner'
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# страницы для анонимов: сколько держать в кэше приложения
+# и сколько разрешать держать обратному прокси
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60
+ANONYMOUS_PAGE_CACHE_MAX_AGE = 60
@@ -0,0 +1,26 @@
+"""Настройка соединений SQLite сразу после открытия.
+
+С настройками по умолчанию SQLite ведёт журнал отката: пока идёт
+запись, читатели ждут, и под нагрузкой new_post и add_comment получают
+«database is locked». В режиме WAL читатели не мешают писателю и
+наоборот, а synchronous=NORMAL в этом режиме сохраняет целостность
+базы, рискуя при отключении питания только последними транзакциями.
+Вместе с CONN_MAX_AGE соединение настраивается один раз на поток, а не
+на каждый запрос.
+
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+    }
+"""
+from django.conf import settings
+
+
+def configure(sender, connection, **kwargs):
+    """Приёмник connection_created: выполнить SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    # busy_timeout идёт первым: переключению в WAL тоже нужна блокировка
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
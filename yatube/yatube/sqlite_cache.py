@@ -0,0 +1,294 @@
+"""Кэш в файле SQLite, общий для всех процессов на машине.
+
+LocMemCache живёт внутри процесса: у каждого воркера WSGI свой холодный
+кэш, а смена поколения в одном воркере не видна остальным. Этот бэкенд
+хранит записи в одном файле SQLite в режиме WAL: читатели не блокируют
+писателя, incr атомарен за счёт BEGIN IMMEDIATE, а размер ограничен
+MAX_ENTRIES с вытеснением давно не читанных записей.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+# время последнего чтения обновляется не чаще, чем раз в столько секунд:
+# иначе каждое чтение превращалось бы в запись
+ACCESS_RESOLUTION = 30
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5000)
+        self.mmap_size = options.get('MMAP_SIZE', 64 * 1024 * 1024)
+        # проверять размер на каждой записи дорого, делаем это раз в
+        # CULL_CHECK_INTERVAL записей процесса
+        self.cull_check_interval = options.get('CULL_CHECK_INTERVAL', 100)
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self.connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def connect(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        connection.executescript(SCHEMA)
+        return connection
+
+    def transaction(self, statements):
+        """Выполнить statements в одной транзакции с блокировкой записи."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def write(self, statements):
+        result = self.transaction(statements)
+        self._writes += 1
+        if self._writes % self.cull_check_interval == 0:
+            self.cull()
+        return result
+
+    def _store(self, connection, key, value, timeout, only_new=False):
+        now = time.time()
+        row = (
+            key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout),
+            now,
+        )
+        if only_new:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?)', row
+            )
+            return cursor.rowcount == 1
+        connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', row
+        )
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.write(
+            lambda connection: self._store(
+                connection, key, value, timeout, only_new=True
+            )
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.write(
+            lambda connection: self._store(connection, key, value, timeout)
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = {}
+        for key, value in data.items():
+            rows[self.make_key(key, version=version)] = value
+        for key in rows:
+            self.validate_key(key)
+
+        def statements(connection):
+            for key, value in rows.items():
+                self._store(connection, key, value, timeout)
+        self.write(statements)
+        return []
+
+    def _fetch(self, keys):
+        now = time.time()
+        found = {}
+        stale = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self.connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({placeholders})',
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = pickle.loads(value)
+                if accessed < now - ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            self.touch_accessed(stale, now)
+        return found
+
+    def touch_accessed(self, keys, now):
+        """Отметить чтение, если база свободна прямо сейчас.
+
+        Отметка о чтении не стоит ожидания блокировки: пока пишет другой
+        процесс, она пропускается, и get не ждёт busy_timeout.
+        """
+        connection = self.connection
+        connection.execute('PRAGMA busy_timeout = 0')
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+        finally:
+            connection.execute(
+                f'PRAGMA busy_timeout = {int(self.busy_timeout)}'
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        found = self._fetch(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self.connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        return self.write(
+            lambda connection: connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (expires, key, time.time()),
+            ).rowcount == 1
+        )
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def statements(connection):
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            return value
+        return self.write(statements)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.write(
+            lambda connection: connection.execute(
+                'DELETE FROM cache WHERE key = ?', (key,)
+            )
+        )
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self.write(
+            lambda connection: connection.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+            )
+        )
+
+    def clear(self):
+        self.write(lambda connection: connection.execute('DELETE FROM cache'))
+
+    def cull(self):
+        """Удалить просроченное, а при переполнении и давно не читанное."""
+        def statements(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+            if count <= self._max_entries:
+                return
+            # CULL_FREQUENCY=0, как и у встроенных бэкендов, очищает всё
+            excess = count
+            if self._cull_frequency:
+                excess = max(
+                    count - self._max_entries, count // self._cull_frequency
+                )
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,),
+            )
+        self.transaction(statements)
+
+    def close(self, **kwargs):
+        # соединение держится на поток и переживает запрос
+        pass
@@ -0,0 +1,40 @@
+"""Тесты со своим кэшем.
+
+Кэш — общий файл SQLite, а при создании тестовой базы post_migrate
+очищает его целиком. Поэтому каждый запуск тестов получает файл кэша во
+временном каталоге: сервер разработки и соседние запуски его не видят.
+manage.py test подключает это через TEST_RUNNER, pytest — через
+conftest.py в корне репозитория.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def isolated_cache():
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        self.cache = isolated_cache()
+        self.cache.__enter__()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.cache.__exit__(None, None, None)
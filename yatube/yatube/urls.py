@@ -19,6 +19,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from . import media
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
@@ -30,6 +32,12 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     # запасной вариант, если первый не сработал
     path("auth/", include("django.contrib.auth.urls")),
+    # картинки постов и миниатюры; отдаёт фронт, если он есть
+    path(
+        settings.MEDIA_URL.lstrip("/") + "<path:path>",
+        media.serve,
+        name="media",
+    ),
     # импорт правил из приложения posts
     path("", include("posts.urls")),
     # импорт правил из приложения about
@@ -42,7 +50,3 @@ if settings.DEBUG:
         settings.STATIC_URL,
         document_root=settings.STATIC_ROOT
     )
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )